@@ -13,20 +13,31 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import atexit
+import collections
+from concurrent import futures
 import functools
+import itertools
+import json
 import math
+import os
+import threading
 import time
 
 import netaddr
 from neutron_lib import constants as const
+from oslo_concurrency import lockutils
 from oslo_log import log
+from oslo_utils import excutils
 from tempest.common import utils as tutils
 from tempest.lib.common.utils import data_utils
+from tempest.lib.common.utils import test_utils
 from tempest.lib import exceptions as lib_exc
 from tempest import test
 
 from neutron_tempest_plugin.api import clients
 from neutron_tempest_plugin.common import constants
+from neutron_tempest_plugin.common import ip as ip_utils
 from neutron_tempest_plugin.common import utils
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin import exceptions
@@ -36,6 +47,170 @@ CONF = config.CONF
 LOG = log.getLogger(__name__)
 
 
+NetworkTopology = collections.namedtuple(
+    'NetworkTopology',
+    ['network', 'subnet', 'router', 'security_group', 'keypair'])
+
+
+class _PooledTopology(object):
+
+    def __init__(self, key, topology, network_client, router_client,
+                 keypairs_client, subnet_cidr):
+        self.key = key
+        self.topology = topology
+        self.network_client = network_client
+        self.router_client = router_client
+        self.keypairs_client = keypairs_client
+        self.subnet_cidr = subnet_cidr
+        self.revisions = {}
+        self.security_group_rule_ids = frozenset()
+
+
+class TopologyPool(object):
+    """Ready network topologies shared by test classes of a process
+
+    Topologies are created for given credentials and requirements. Once a
+    test class doesn't need a topology anymore it is reset and kept ready
+    to be leased to the next test class using the same credentials and
+    requirements, and they are all deleted when the process exits.
+    """
+
+    def __init__(self):
+        self._ready = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        self._exit_registered = False
+
+    def lease(self, key):
+        """Returns a ready topology or None if there isn't any"""
+        with self._lock:
+            ready = self._ready.get(key)
+            return ready.pop() if ready else None
+
+    def mark_ready(self, pooled):
+        """Records the state given topology is reset to once released"""
+        pooled.revisions = self._get_revisions(pooled)
+        pooled.security_group_rule_ids = frozenset(
+            self._list_security_group_rule_ids(pooled))
+
+    def add(self, pooled):
+        """Keeps given ready topology if there is room for it"""
+        with self._lock:
+            ready = self._ready[pooled.key]
+            if len(ready) < CONF.neutron_plugin_options.topology_pool_size:
+                ready.append(pooled)
+                if not self._exit_registered:
+                    atexit.register(self.delete_all)
+                    self._exit_registered = True
+                return
+        self.delete(pooled)
+
+    def release(self, pooled):
+        """Resets given topology and keeps it ready or deletes it
+
+        Security group rules created after the topology was made ready are
+        deleted. A topology whose network, subnet or router has been
+        updated, or whose network still has ports other than router and
+        DHCP ones, is deleted.
+        """
+        try:
+            reusable = self._reset(pooled)
+        except Exception:
+            LOG.exception('Failed to reset network topology %s',
+                          pooled.topology.network['id'])
+            reusable = False
+        if reusable:
+            self.add(pooled)
+        else:
+            self.delete(pooled)
+
+    def detach(self, pooled):
+        """Detaches given topology from class resources about to be deleted
+
+        A QoS policy attached to the topology network can't be deleted
+        until it is detached. The topology network is updated then, so
+        the topology is going to be deleted once released.
+        """
+        network_id = pooled.topology.network['id']
+        try:
+            network = pooled.network_client.show_network(
+                network_id)['network']
+            if network.get('qos_policy_id'):
+                pooled.network_client.update_network(
+                    network_id, qos_policy_id=None)
+        except Exception:
+            LOG.exception('Failed to detach network topology %s',
+                          network_id)
+
+    def delete_all(self):
+        with self._lock:
+            pooled_topologies = [pooled for ready in self._ready.values()
+                                 for pooled in ready]
+            self._ready.clear()
+        for pooled in pooled_topologies:
+            self.delete(pooled)
+
+    def delete(self, pooled):
+        topology = pooled.topology
+        try:
+            test_utils.call_and_ignore_notfound_exc(
+                pooled.router_client.remove_router_interface_with_subnet_id,
+                topology.router['id'], topology.subnet['id'])
+            test_utils.call_and_ignore_notfound_exc(
+                pooled.router_client.delete_router, topology.router['id'])
+            test_utils.call_and_ignore_notfound_exc(
+                pooled.network_client.delete_network, topology.network['id'])
+            test_utils.call_and_ignore_notfound_exc(
+                pooled.network_client.delete_security_group,
+                topology.security_group['id'])
+            test_utils.call_and_ignore_notfound_exc(
+                pooled.keypairs_client.delete_keypair,
+                topology.keypair['name'])
+        except Exception:
+            LOG.exception('Failed to delete network topology %s',
+                          topology.network['id'])
+            return
+        if pooled.subnet_cidr is not None:
+            allocator = BaseNetworkTest._get_shared_cidr_allocator()
+            if allocator:
+                allocator.release([pooled.subnet_cidr])
+
+    def _reset(self, pooled):
+        topology = pooled.topology
+        client = pooled.network_client
+        for rule_id in (set(self._list_security_group_rule_ids(pooled)) -
+                        pooled.security_group_rule_ids):
+            test_utils.call_and_ignore_notfound_exc(
+                client.delete_security_group_rule, rule_id)
+
+        ports = client.list_ports(network_id=topology.network['id'],
+                                  fields=['device_owner'])['ports']
+        owners = set(const.ROUTER_INTERFACE_OWNERS_SNAT)
+        owners.add(const.DEVICE_OWNER_DHCP)
+        if any(port['device_owner'] not in owners for port in ports):
+            return False
+        return self._get_revisions(pooled) == pooled.revisions
+
+    def _get_revisions(self, pooled):
+        topology = pooled.topology
+        client = pooled.network_client
+        return {
+            'network': client.show_network(
+                topology.network['id'])['network']['revision_number'],
+            'subnet': client.show_subnet(
+                topology.subnet['id'])['subnet']['revision_number'],
+            'router': pooled.router_client.show_router(
+                topology.router['id'])['router']['revision_number']}
+
+    def _list_security_group_rule_ids(self, pooled):
+        rules = pooled.network_client.list_security_group_rules(
+            security_group_id=pooled.topology.security_group['id'],
+            fields=['id'])['security_group_rules']
+        return [rule['id'] for rule in rules]
+
+
+_TOPOLOGY_POOL = TopologyPool()
+
+
 class BaseNetworkTest(test.BaseTestCase):
 
     """Base class for Neutron tests that use the Tempest Neutron REST client
@@ -68,6 +243,9 @@ class BaseNetworkTest(test.BaseTestCase):
 
     external_network_id = CONF.network.public_network_id
 
+    # CIDRs of external subnets listed by any test class of this process
+    _external_subnet_cidrs = None
+
     @classmethod
     def get_client_manager(cls, credential_type=None, roles=None,
                            force_new=None):
@@ -138,154 +316,244 @@ class BaseNetworkTest(test.BaseTestCase):
         cls.projects = []
         cls.log_objects = []
         cls.reserved_subnet_cidrs = set()
+        cls.allocated_subnet_cidrs = []
         cls.keypairs = []
         cls.trunks = []
         cls.network_segment_ranges = []
         cls.conntrack_helpers = []
+        cls.leased_topologies = []
 
     @classmethod
     def reserve_external_subnet_cidrs(cls):
+        ext_cidrs = cls.get_external_subnet_cidrs()
+        for ext_cidr in ext_cidrs:
+            cls.reserve_subnet_cidr(ext_cidr)
+
+        # Subnets allocated by any other test class can't overlap external
+        # subnets either
+        allocator = cls._get_shared_cidr_allocator()
+        if allocator and ext_cidrs:
+            allocator.reserve(ext_cidrs)
+
+    @classmethod
+    def get_external_subnet_cidrs(cls):
+        """Get CIDRs of the subnets of every external network
+
+        External networks are listed only once by every process and CIDRs of
+        their subnets are shared by all test classes. If
+        external_subnet_cidrs_cache_time option is set, they are also shared
+        with test classes running in other processes for that time.
+        Call invalidate_external_subnet_cidrs method to list them again.
+        """
+        ext_cidrs = BaseNetworkTest._external_subnet_cidrs
+        if ext_cidrs is None:
+            ext_cidrs = cls._load_external_subnet_cidrs()
+            if ext_cidrs is None:
+                ext_cidrs = cls._list_external_subnet_cidrs()
+                cls._store_external_subnet_cidrs(ext_cidrs)
+            BaseNetworkTest._external_subnet_cidrs = ext_cidrs
+        return list(ext_cidrs)
+
+    @classmethod
+    def invalidate_external_subnet_cidrs(cls):
+        """Forget external subnet CIDRs cached by all test classes"""
+        BaseNetworkTest._external_subnet_cidrs = None
+        path = cls._get_external_subnet_cidrs_path()
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def _list_external_subnet_cidrs(cls):
         client = cls.os_admin.network_client
         ext_nets = client.list_networks(
             **{"router:external": True})['networks']
+        ext_cidrs = []
         for ext_net in ext_nets:
             ext_subnets = client.list_subnets(
                 network_id=ext_net['id'])['subnets']
             for ext_subnet in ext_subnets:
-                cls.reserve_subnet_cidr(ext_subnet['cidr'])
+                ext_cidrs.append(ext_subnet['cidr'])
+        return ext_cidrs
+
+    @classmethod
+    def _get_external_subnet_cidrs_path(cls):
+        lock_path = lockutils.get_lock_path(CONF)
+        if (CONF.neutron_plugin_options.external_subnet_cidrs_cache_time and
+                lock_path):
+            return os.path.join(
+                lock_path, 'neutron-tempest-plugin-external-subnet-cidrs.json')
+
+    @classmethod
+    def _load_external_subnet_cidrs(cls):
+        path = cls._get_external_subnet_cidrs_path()
+        if path:
+            try:
+                with open(path) as f:
+                    cache = json.load(f)
+            except FileNotFoundError:
+                return None
+            cache_time = (
+                CONF.neutron_plugin_options.external_subnet_cidrs_cache_time)
+            if 0 <= time.time() - cache['time'] < cache_time:
+                return cache['cidrs']
+
+    @classmethod
+    def _store_external_subnet_cidrs(cls, ext_cidrs):
+        path = cls._get_external_subnet_cidrs_path()
+        if path:
+            # Written file is replaced at once, so that other processes never
+            # read it partially written
+            tmp_path = '%s.%d' % (path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump({'time': time.time(), 'cidrs': ext_cidrs}, f)
+            os.replace(tmp_path, path)
 
     @classmethod
     def resource_cleanup(cls):
         if CONF.service_available.neutron:
-            # Clean up trunks
-            for trunk in cls.trunks:
-                cls._try_delete_resource(cls.delete_trunk, trunk)
-
-            # Clean up port forwardings
-            for pf in cls.port_forwardings:
-                cls._try_delete_resource(cls.delete_port_forwarding, pf)
-
-            # Clean up floating IPs
-            for floating_ip in cls.floating_ips:
-                cls._try_delete_resource(cls.delete_floatingip, floating_ip)
-
-            # Clean up Local IP Associations
-            for association in cls.local_ip_associations:
-                cls._try_delete_resource(cls.delete_local_ip_association,
-                                         association)
-            # Clean up Local IPs
-            for local_ip in cls.local_ips:
-                cls._try_delete_resource(cls.delete_local_ip,
-                                         local_ip)
-
-            # Clean up conntrack helpers
-            for cth in cls.conntrack_helpers:
-                cls._try_delete_resource(cls.delete_conntrack_helper, cth)
-
-            # Clean up routers
-            for router in cls.routers:
-                cls._try_delete_resource(cls.delete_router,
-                                         router)
-            # Clean up metering label rules
-            for metering_label_rule in cls.metering_label_rules:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_metering_label_rule,
-                    metering_label_rule['id'])
-            # Clean up metering labels
-            for metering_label in cls.metering_labels:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_metering_label,
-                    metering_label['id'])
-            # Clean up flavors
-            for flavor in cls.flavors:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_flavor,
-                    flavor['id'])
-            # Clean up service profiles
-            for service_profile in cls.service_profiles:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_service_profile,
-                    service_profile['id'])
-            # Clean up ports
-            for port in cls.ports:
-                cls._try_delete_resource(cls.client.delete_port,
-                                         port['id'])
-            # Clean up subnets
-            for subnet in cls.subnets:
-                cls._try_delete_resource(cls.client.delete_subnet,
-                                         subnet['id'])
-            # Clean up admin subnets
-            for subnet in cls.admin_subnets:
-                cls._try_delete_resource(cls.admin_client.delete_subnet,
-                                         subnet['id'])
-            # Clean up networks
-            for network in cls.networks:
-                cls._try_delete_resource(cls.delete_network, network)
-
-            # Clean up admin networks
-            for network in cls.admin_networks:
-                cls._try_delete_resource(cls.admin_client.delete_network,
-                                         network['id'])
-
-            # Clean up security groups
-            for security_group in cls.security_groups:
-                cls._try_delete_resource(cls.delete_security_group,
-                                         security_group)
-
-            # Clean up admin security groups
-            for security_group in cls.admin_security_groups:
-                cls._try_delete_resource(cls.delete_security_group,
-                                         security_group,
-                                         client=cls.admin_client)
-
-            for subnetpool in cls.subnetpools:
-                cls._try_delete_resource(cls.client.delete_subnetpool,
-                                         subnetpool['id'])
-
-            for subnetpool in cls.admin_subnetpools:
-                cls._try_delete_resource(cls.admin_client.delete_subnetpool,
-                                         subnetpool['id'])
-
-            for address_scope in cls.address_scopes:
-                cls._try_delete_resource(cls.client.delete_address_scope,
-                                         address_scope['id'])
-
-            for address_scope in cls.admin_address_scopes:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_address_scope,
-                    address_scope['id'])
-
-            for project in cls.projects:
-                cls._try_delete_resource(
-                    cls.identity_admin_client.delete_project,
-                    project['id'])
-
-            # Clean up QoS rules
-            for qos_rule in cls.qos_rules:
-                cls._try_delete_resource(cls.admin_client.delete_qos_rule,
-                                         qos_rule['id'])
-            # Clean up QoS policies
+            for pooled in cls.leased_topologies:
+                _TOPOLOGY_POOL.detach(pooled)
+            for deletions in cls._get_resource_cleanup_tiers():
+                cls._delete_resources(deletions)
+
+        if cls.allocated_subnet_cidrs:
+            cls._get_shared_cidr_allocator().release(
+                cls.allocated_subnet_cidrs)
+            cls.allocated_subnet_cidrs = []
+
+        super(BaseNetworkTest, cls).resource_cleanup()
+
+        # Servers and other resources using leased topologies have been
+        # deleted by class cleanups
+        for pooled in cls.leased_topologies:
+            _TOPOLOGY_POOL.release(pooled)
+        cls.leased_topologies = []
+
+    @classmethod
+    def _get_resource_cleanup_tiers(cls):
+        """Returns deletions of the resources created by the test class
+
+        Deletions are grouped in tiers to be executed in the given order. A
+        tier only contains deletions of resources not depending on each other
+        but only on resources deleted by following tiers.
+        """
+        admin_client = getattr(cls, 'admin_client', None)
+        return [
+            # Resources attached to ports, floating IPs and routers
+            [functools.partial(cls.delete_trunk, trunk)
+             for trunk in cls.trunks] +
+            [functools.partial(cls.delete_port_forwarding, pf)
+             for pf in cls.port_forwardings] +
+            [functools.partial(cls.delete_local_ip_association, association)
+             for association in cls.local_ip_associations] +
+            [functools.partial(cls.delete_conntrack_helper, cth)
+             for cth in cls.conntrack_helpers] +
+            [functools.partial(admin_client.delete_metering_label_rule,
+                               metering_label_rule['id'])
+             for metering_label_rule in cls.metering_label_rules] +
+            [functools.partial(admin_client.delete_log, log_object['id'])
+             for log_object in cls.log_objects],
+
+            [functools.partial(cls.delete_floatingip, floating_ip)
+             for floating_ip in cls.floating_ips] +
+            [functools.partial(cls.delete_local_ip, local_ip)
+             for local_ip in cls.local_ips] +
+            [functools.partial(admin_client.delete_metering_label,
+                               metering_label['id'])
+             for metering_label in cls.metering_labels] +
+            [functools.partial(admin_client.delete_flavor, flavor['id'])
+             for flavor in cls.flavors],
+
+            [functools.partial(cls.delete_router, router)
+             for router in cls.routers] +
+            [functools.partial(admin_client.delete_service_profile,
+                               service_profile['id'])
+             for service_profile in cls.service_profiles],
+
+            [functools.partial(cls.client.delete_port, port['id'])
+             for port in cls.ports],
+
+            [functools.partial(cls.client.delete_subnet, subnet['id'])
+             for subnet in cls.subnets] +
+            [functools.partial(admin_client.delete_subnet, subnet['id'])
+             for subnet in cls.admin_subnets],
+
+            [functools.partial(cls.delete_network, network)
+             for network in cls.networks] +
+            [functools.partial(admin_client.delete_network, network['id'])
+             for network in cls.admin_networks],
+
+            [functools.partial(cls.delete_security_group, security_group)
+             for security_group in cls.security_groups] +
+            [functools.partial(cls.delete_security_group, security_group,
+                               client=admin_client)
+             for security_group in cls.admin_security_groups] +
+            [functools.partial(cls.client.delete_subnetpool, subnetpool['id'])
+             for subnetpool in cls.subnetpools] +
+            [functools.partial(admin_client.delete_subnetpool,
+                               subnetpool['id'])
+             for subnetpool in cls.admin_subnetpools] +
+            [functools.partial(admin_client.delete_qos_rule, qos_rule['id'])
+             for qos_rule in cls.qos_rules] +
+            [functools.partial(cls.delete_keypair, keypair)
+             for keypair in cls.keypairs] +
+            [functools.partial(admin_client.delete_network_segment_range,
+                               network_segment_range['id'])
+             for network_segment_range in cls.network_segment_ranges],
+
+            [functools.partial(cls.client.delete_address_scope,
+                               address_scope['id'])
+             for address_scope in cls.address_scopes] +
+            [functools.partial(admin_client.delete_address_scope,
+                               address_scope['id'])
+             for address_scope in cls.admin_address_scopes] +
             # as all networks and ports are already removed, QoS policies
             # shouldn't be "in use"
-            for qos_policy in cls.qos_policies:
-                cls._try_delete_resource(cls.admin_client.delete_qos_policy,
-                                         qos_policy['id'])
+            [functools.partial(admin_client.delete_qos_policy,
+                               qos_policy['id'])
+             for qos_policy in cls.qos_policies] +
+            [functools.partial(cls.identity_admin_client.delete_project,
+                               project['id'])
+             for project in cls.projects],
+        ]
 
-            # Clean up log_objects
-            for log_object in cls.log_objects:
-                cls._try_delete_resource(cls.admin_client.delete_log,
-                                         log_object['id'])
+    @classmethod
+    def _delete_resources(cls, deletions):
+        """Executes given resource deletions concurrently
 
-            for keypair in cls.keypairs:
-                cls._try_delete_resource(cls.delete_keypair, keypair)
+        Deletions failing because the resource is still in use are retried
+        until CONF.network.build_timeout expires. Once all deletions are
+        over, the first error raised by any of them is raised again.
 
-            # Clean up network_segment_ranges
-            for network_segment_range in cls.network_segment_ranges:
-                cls._try_delete_resource(
-                    cls.admin_client.delete_network_segment_range,
-                    network_segment_range['id'])
+        :param deletions: callables deleting a resource each
+        """
+        if not deletions:
+            return
+        workers = min(len(deletions),
+                      CONF.neutron_plugin_options.resource_cleanup_workers)
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = [executor.submit(cls._try_delete_resource_in_use,
+                                       delete_callable)
+                       for delete_callable in deletions]
+        for result in results:
+            result.result()
 
-        super(BaseNetworkTest, cls).resource_cleanup()
+    @classmethod
+    def _try_delete_resource_in_use(cls, delete_callable, *args, **kwargs):
+        timeout = time.time() + CONF.network.build_timeout
+        while True:
+            try:
+                return cls._try_delete_resource(delete_callable, *args,
+                                                **kwargs)
+            except lib_exc.Conflict:
+                if time.time() > timeout:
+                    raise
+                LOG.debug('Resource still in use, retrying deletion in %s '
+                          'seconds', CONF.network.build_interval)
+                time.sleep(CONF.network.build_interval)
 
     @classmethod
     def _try_delete_resource(cls, delete_callable, *args, **kwargs):
@@ -568,6 +836,15 @@ class BaseNetworkTest(test.BaseTestCase):
             else:
                 raise ValueError('Invalid IP version: {!r}'.format(ip_version))
 
+            allocator = cls._get_shared_cidr_allocator()
+            if allocator and mask_bits:
+                # Every worker process allocates subnet CIDRs from the same
+                # configured CIDR, so they are taken from a shared allocator
+                for subnet_cidr in cls._allocate_subnet_cidrs(
+                        allocator, cidr, mask_bits):
+                    yield subnet_cidr
+                return
+
         if mask_bits:
             subnet_cidrs = cidr.subnet(mask_bits)
         else:
@@ -577,18 +854,208 @@ class BaseNetworkTest(test.BaseTestCase):
             if subnet_cidr not in cls.reserved_subnet_cidrs:
                 yield subnet_cidr
 
+    @classmethod
+    def _allocate_subnet_cidrs(cls, allocator, cidr, mask_bits):
+        while True:
+            try:
+                subnet_cidr = allocator.allocate(
+                    cidr, mask_bits, used=cls.reserved_subnet_cidrs)
+            except exceptions.NoFreeCIDR:
+                return
+            # Allocated CIDRs are released once the class resources have
+            # been deleted
+            cls.allocated_subnet_cidrs.append(subnet_cidr)
+            yield subnet_cidr
+
+    @classmethod
+    def _get_shared_cidr_allocator(cls):
+        lock_path = lockutils.get_lock_path(CONF)
+        if CONF.neutron_plugin_options.share_subnet_cidrs and lock_path:
+            return ip_utils.SharedCIDRAllocator(os.path.join(
+                lock_path, 'neutron-tempest-plugin-subnet-cidrs.json'))
+
+    @classmethod
+    def lease_topology(cls, ip_version=None, external_gateway=True,
+                       **router_kwargs):
+        """Get a network topology ready to be used by the test class
+
+        A topology is made of a network with a subnet connected to a router,
+        a security group and a keypair, all of them owned by primary
+        credentials.
+
+        When topology_pool_size option is set and credentials are not
+        dynamic, topologies are leased from a pool shared by the test
+        classes of the process. The first time a topology is required,
+        topology_pool_size topologies with the same requirements are created
+        at once. Leased topologies are given back to the pool once the class
+        resources have been cleaned up. Otherwise the topology is created for
+        the test class only and deleted with the other class resources.
+
+        :param ip_version: IP version of the subnet
+        :param external_gateway: whether the router has a gateway on the
+        configured public network
+        :param **router_kwargs: router attributes like distributed or ha.
+        When given, the router is created with admin credentials.
+        :return: a NetworkTopology
+        """
+        ip_version = ip_version or cls._ip_version
+        if (not CONF.neutron_plugin_options.topology_pool_size or
+                CONF.auth.use_dynamic_credentials):
+            return cls._create_topology(ip_version, external_gateway,
+                                        router_kwargs)
+
+        key = (cls.client.user_id, ip_version, external_gateway,
+               tuple(sorted(router_kwargs.items())))
+        pooled = _TOPOLOGY_POOL.lease(key)
+        if pooled is None:
+            # Topologies are created concurrently: their subnet CIDRs are
+            # taken from the same sequence before, so that they all differ
+            subnet_cidrs = list(itertools.islice(
+                cls.get_subnet_cidrs(ip_version=ip_version),
+                CONF.neutron_plugin_options.topology_pool_size))
+            if not subnet_cidrs:
+                message = ('Available CIDR for subnet creation could not be '
+                           'found')
+                raise ValueError(message)
+            with futures.ThreadPoolExecutor(
+                    max_workers=len(subnet_cidrs)) as executor:
+                creations = [
+                    executor.submit(cls._create_pooled_topology, key,
+                                    subnet_cidr, external_gateway,
+                                    router_kwargs)
+                    for subnet_cidr in subnet_cidrs]
+            created = []
+            for creation in creations:
+                try:
+                    created.append(creation.result())
+                except Exception:
+                    LOG.exception('Failed to create network topology')
+            if not created:
+                # Report the failure of the topology required by the class
+                creations[0].result()
+            pooled = created.pop()
+            for other in created:
+                _TOPOLOGY_POOL.add(other)
+        cls.leased_topologies.append(pooled)
+        cls.try_reserve_subnet_cidr(pooled.topology.subnet['cidr'])
+        return pooled.topology
+
+    @classmethod
+    def _get_topology_router_kwargs(cls, external_gateway, router_kwargs):
+        external_network_id = None
+        if external_gateway:
+            external_network_id = CONF.network.public_network_id
+        return dict(router_kwargs,
+                    router_name=data_utils.rand_name('router'),
+                    admin_state_up=True,
+                    external_network_id=external_network_id)
+
+    @classmethod
+    def _create_topology(cls, ip_version, external_gateway, router_kwargs):
+        network = cls.create_network()
+        subnet = cls.create_subnet(network, ip_version=ip_version)
+        kwargs = cls._get_topology_router_kwargs(external_gateway,
+                                                 router_kwargs)
+        if router_kwargs:
+            router = cls.create_admin_router(
+                project_id=cls.client.tenant_id, **kwargs)
+        else:
+            router = cls.create_router(**kwargs)
+        cls.create_router_interface(router['id'], subnet['id'])
+        security_group = cls.create_security_group()
+        keypair = cls.create_keypair()
+        return NetworkTopology(network, subnet, router, security_group,
+                               keypair)
+
+    @classmethod
+    def _create_pooled_topology(cls, key, subnet_cidr, external_gateway,
+                                router_kwargs):
+        # Topology resources aren't recorded by the test class, as they are
+        # deleted by the pool
+        client = cls.client
+        router_client = client
+        keypairs_client = cls.os_primary.keypairs_client
+        params = cls._get_router_params(**cls._get_topology_router_kwargs(
+            external_gateway, router_kwargs))
+        if router_kwargs:
+            router_client = cls.os_admin.network_client
+            params['project_id'] = client.tenant_id
+
+        deletions = []
+        try:
+            network = client.create_network(
+                name=data_utils.rand_name('test-network'))['network']
+            deletions.append(functools.partial(client.delete_network,
+                                               network['id']))
+            subnet = client.create_subnet(
+                network_id=network['id'], cidr=str(subnet_cidr),
+                ip_version=subnet_cidr.version,
+                gateway_ip=str(subnet_cidr.ip + 1))['subnet']
+            router = router_client.create_router(
+                params.pop('name'), **params)['router']
+            deletions.append(functools.partial(router_client.delete_router,
+                                               router['id']))
+            router_client.add_router_interface_with_subnet_id(router['id'],
+                                                              subnet['id'])
+            deletions.append(functools.partial(
+                router_client.remove_router_interface_with_subnet_id,
+                router['id'], subnet['id']))
+            security_group = client.create_security_group(
+                name=data_utils.rand_name('test-secgroup'))['security_group']
+            deletions.append(functools.partial(client.delete_security_group,
+                                               security_group['id']))
+            keypair = keypairs_client.create_keypair(
+                name=data_utils.rand_name('keypair-test'))['keypair']
+            deletions.append(functools.partial(keypairs_client.delete_keypair,
+                                               keypair['name']))
+            pooled = _PooledTopology(
+                key, NetworkTopology(network, subnet, router, security_group,
+                                     keypair),
+                network_client=client, router_client=router_client,
+                keypairs_client=keypairs_client, subnet_cidr=None)
+            _TOPOLOGY_POOL.mark_ready(pooled)
+        except Exception:
+            # The subnet CIDR is going to be released with the class ones
+            with excutils.save_and_reraise_exception():
+                for deletion in reversed(deletions):
+                    test_utils.call_and_ignore_notfound_exc(deletion)
+
+        # Shared allocation of the topology subnet CIDR is released by the
+        # pool once the topology is deleted
+        if subnet_cidr in cls.allocated_subnet_cidrs:
+            cls.allocated_subnet_cidrs.remove(subnet_cidr)
+            pooled.subnet_cidr = subnet_cidr
+        return pooled
+
     @classmethod
     def create_port(cls, network, **kwargs):
         """Wrapper utility that returns a test port."""
+        body = cls.client.create_port(**cls._get_port_params(network,
+                                                             **kwargs))
+        port = body['port']
+        cls.ports.append(port)
+        return port
+
+    @classmethod
+    def create_ports(cls, network, port_list):
+        """Wrapper utility that returns test ports created in bulk.
+
+        :param port_list: list of dictionaries with the parameters
+        create_port method would be called with for every port.
+        """
+        body = cls.client.create_bulk_port(
+            [cls._get_port_params(network, **kwargs) for kwargs in port_list])
+        ports = body['ports']
+        cls.ports.extend(ports)
+        return ports
+
+    @classmethod
+    def _get_port_params(cls, network, **kwargs):
         if CONF.network.port_vnic_type and 'binding:vnic_type' not in kwargs:
             kwargs['binding:vnic_type'] = CONF.network.port_vnic_type
         if CONF.network.port_profile and 'binding:profile' not in kwargs:
             kwargs['binding:profile'] = CONF.network.port_profile
-        body = cls.client.create_port(network_id=network['id'],
-                                      **kwargs)
-        port = body['port']
-        cls.ports.append(port)
-        return port
+        return dict(network_id=network['id'], **kwargs)
 
     @classmethod
     def update_port(cls, port, **kwargs):
@@ -598,8 +1065,16 @@ class BaseNetworkTest(test.BaseTestCase):
         return body['port']
 
     @classmethod
-    def _create_router_with_client(
-        cls, client, router_name=None, admin_state_up=False,
+    def _create_router_with_client(cls, client, *args, **kwargs):
+        params = cls._get_router_params(*args, **kwargs)
+        body = client.create_router(params.pop('name'), **params)
+        router = body['router']
+        cls.routers.append(router)
+        return router
+
+    @classmethod
+    def _get_router_params(
+        cls, router_name=None, admin_state_up=False,
         external_network_id=None, enable_snat=None, **kwargs
     ):
         ext_gw_info = {}
@@ -607,17 +1082,28 @@ class BaseNetworkTest(test.BaseTestCase):
             ext_gw_info['network_id'] = external_network_id
         if enable_snat is not None:
             ext_gw_info['enable_snat'] = enable_snat
-        body = client.create_router(
-            router_name, external_gateway_info=ext_gw_info,
-            admin_state_up=admin_state_up, **kwargs)
-        router = body['router']
-        cls.routers.append(router)
-        return router
+        return dict(kwargs, name=router_name,
+                    external_gateway_info=ext_gw_info,
+                    admin_state_up=admin_state_up)
 
     @classmethod
     def create_router(cls, *args, **kwargs):
         return cls._create_router_with_client(cls.client, *args, **kwargs)
 
+    @classmethod
+    def create_routers(cls, router_list, client=None):
+        """Wrapper utility that returns test routers created in bulk.
+
+        :param router_list: list of dictionaries with the parameters
+        create_router method would be called with for every router.
+        """
+        client = client or cls.client
+        body = client.create_bulk_router(
+            [cls._get_router_params(**kwargs) for kwargs in router_list])
+        routers = body['routers']
+        cls.routers.extend(routers)
+        return routers
+
     @classmethod
     def create_admin_router(cls, *args, **kwargs):
         return cls._create_router_with_client(cls.os_admin.network_client,
@@ -968,6 +1454,43 @@ class BaseNetworkTest(test.BaseTestCase):
     @classmethod
     def create_security_group_rule(cls, security_group=None, project=None,
                                    client=None, ip_version=None, **kwargs):
+        client, params = cls._get_security_group_rule_params(
+            security_group=security_group, project=project, client=client,
+            ip_version=ip_version, **kwargs)
+        return client.create_security_group_rule(**params)[
+            'security_group_rule']
+
+    @classmethod
+    def create_security_group_rules(cls, rule_list, security_group=None,
+                                    project=None, client=None,
+                                    ip_version=None):
+        """Creates security group rules in bulk.
+
+        :param rule_list: list of dictionaries with the parameters
+        create_security_group_rule method would be called with for every rule
+        in addition to the ones given to this method.
+        """
+        if not security_group and any('security_group_id' not in rule
+                                      for rule in rule_list):
+            # Look up the default security group only once
+            security_group = cls.get_security_group(
+                client=client or (project and cls.admin_client))
+
+        rules = []
+        for rule in rule_list:
+            rule_client, params = cls._get_security_group_rule_params(
+                security_group=security_group, project=project,
+                client=client, ip_version=ip_version, **rule)
+            rules.append(params)
+        if not rules:
+            return []
+        return rule_client.create_bulk_security_group_rule(rules)[
+            'security_group_rules']
+
+    @classmethod
+    def _get_security_group_rule_params(
+            cls, security_group=None, project=None, client=None,
+            ip_version=None, **kwargs):
         if project:
             client = client or cls.admin_client
             project_id = kwargs.setdefault('project_id', project['id'])
@@ -995,15 +1518,12 @@ class BaseNetworkTest(test.BaseTestCase):
         for key, value in default_params.items():
             kwargs.setdefault(key, value)
 
-        client = client or cls.client
-        return client.create_security_group_rule(**kwargs)[
-            'security_group_rule']
+        return client or cls.client, kwargs
 
     @classmethod
     def get_security_group(cls, name='default', client=None):
         client = client or cls.client
-        security_groups = client.list_security_groups()['security_groups']
-        for security_group in security_groups:
+        for security_group in client.iter_security_groups():
             if security_group['name'] == name:
                 return security_group
         raise ValueError("No such security group named {!r}".format(name))
@@ -1223,42 +1743,54 @@ class BaseAdminNetworkTest(BaseNetworkTest):
     @classmethod
     def get_unused_ip(cls, net_id, ip_version=None):
         """Get an unused ip address in a allocation pool of net"""
-        body = cls.admin_client.list_ports(network_id=net_id)
-        ports = body['ports']
-        used_ips = []
-        for port in ports:
-            used_ips.extend(
-                [fixed_ip['ip_address'] for fixed_ip in port['fixed_ips']])
-        body = cls.admin_client.list_subnets(network_id=net_id)
+        return cls.get_unused_ips(net_id, 1, ip_version=ip_version)[0]
+
+    @classmethod
+    def get_unused_ips(cls, net_id, count, ip_version=None):
+        """Get unused ip addresses in allocation pools of net
+
+        :param net_id: ID of the network
+        :param count: number of addresses to be returned
+        :param ip_version: optional IP version of the addresses
+        :return: list of IP addresses as strings
+        """
+        used_ips = collections.defaultdict(list)
+        for port in cls.admin_client.iter_ports(network_id=net_id,
+                                                fields=['fixed_ips']):
+            for fixed_ip in port['fixed_ips']:
+                used_ips[fixed_ip['subnet_id']].append(
+                    int(netaddr.IPAddress(fixed_ip['ip_address'])))
+        body = cls.admin_client.list_subnets(
+            network_id=net_id,
+            fields=['id', 'ip_version', 'cidr', 'allocation_pools'])
         subnets = body['subnets']
 
+        unused_ips = []
         for subnet in subnets:
             if ip_version and subnet['ip_version'] != ip_version:
                 continue
-            cidr = subnet['cidr']
             allocation_pools = subnet['allocation_pools']
-            iterators = []
             if allocation_pools:
-                for allocation_pool in allocation_pools:
-                    iterators.append(netaddr.iter_iprange(
-                        allocation_pool['start'], allocation_pool['end']))
+                ranges = [(int(netaddr.IPAddress(allocation_pool['start'])),
+                           int(netaddr.IPAddress(allocation_pool['end'])))
+                          for allocation_pool in allocation_pools]
             else:
-                net = netaddr.IPNetwork(cidr)
-
-                def _iterip():
-                    for ip in net:
-                        if ip not in (net.network, net.broadcast):
-                            yield ip
-                iterators.append(iter(_iterip()))
-
-            for iterator in iterators:
-                for ip in iterator:
-                    if str(ip) not in used_ips:
-                        return str(ip)
+                net = netaddr.IPNetwork(subnet['cidr'])
+                last = net.last
+                if net.broadcast is not None:
+                    last = int(net.broadcast) - 1
+                ranges = [(net.first + 1, last)]
+
+            for address in ip_utils.iter_unused_addresses(
+                    ranges, used_ips[subnet['id']]):
+                unused_ips.append(str(netaddr.IPAddress(
+                    address, version=subnet['ip_version'])))
+                if len(unused_ips) == count:
+                    return unused_ips
 
         message = (
             "net(%s) has no usable IP address in allocation pools" % net_id)
-        raise exceptions.InvalidConfiguration(message)
+        raise lib_exc.InvalidConfiguration(message)
 
     @classmethod
     def create_provider_network(cls, physnet_name, start_segmentation_id,
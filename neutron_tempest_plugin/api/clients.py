@@ -26,6 +26,7 @@ from tempest.lib.services.network import qos_limit_bandwidth_rules_client
 from tempest.lib.services.network import qos_minimum_bandwidth_rules_client
 from tempest.lib.services.network import qos_minimum_packet_rate_rules_client
 
+from neutron_tempest_plugin.common import http
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin.services.network.json import network_client
 
@@ -126,6 +127,17 @@ class Manager(clients.ServiceClients):
                 build_timeout=CONF.network.build_timeout,
                 **self.default_params)
 
+        self.share_http_connections()
+
+    def share_http_connections(self):
+        """Makes clients share keep-alive HTTP connections when enabled
+
+        Subclasses creating more clients should call it again once they are
+        created.
+        """
+        if CONF.neutron_plugin_options.http_keep_alive:
+            http.share_http_connections(vars(self).values())
+
     def _set_identity_clients(self):
         params = {
             'service': CONF.identity.catalog_type,
@@ -41,8 +41,7 @@ class FloatingIPTestJSON(base.BaseNetworkTest):
         cls.create_router_interface(cls.router['id'], cls.subnet['id'])
         cls.port = list()
         # Create two ports one each for Creation and Updating of floatingIP
-        for i in range(2):
-            cls.create_port(cls.network)
+        cls.create_ports(cls.network, [{}, {}])
 
     @decorators.idempotent_id('f6a0fb6c-cb64-4b81-b0d5-f41d8f69d22d')
     def test_blank_update_clears_association(self):
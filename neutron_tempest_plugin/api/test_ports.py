@@ -182,8 +182,7 @@ class PortsSearchCriteriaTest(base.BaseSearchCriteriaTest):
     def resource_setup(cls):
         super(PortsSearchCriteriaTest, cls).resource_setup()
         net = cls.create_network(network_name='port-search-test-net')
-        for name in cls.resource_names:
-            cls.create_port(net, name=name)
+        cls.create_ports(net, [{'name': name} for name in cls.resource_names])
 
     @decorators.idempotent_id('9ab73df4-960a-4ae3-87d3-60992b8d3e2d')
     def test_list_sorts_asc(self):
@@ -418,8 +418,8 @@ class RoutersSearchCriteriaTest(base.BaseSearchCriteriaTest):
     @classmethod
     def resource_setup(cls):
         super(RoutersSearchCriteriaTest, cls).resource_setup()
-        for name in cls.resource_names:
-            cls.create_router(router_name=name)
+        cls.create_routers([{'router_name': name}
+                            for name in cls.resource_names])
 
     @decorators.idempotent_id('03a69efb-90a7-435b-bb5c-3add3612085a')
     def test_list_sorts_asc(self):
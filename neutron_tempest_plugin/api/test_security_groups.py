@@ -280,13 +280,13 @@ class BaseSecGroupRulesQuota(base.BaseAdminNetworkTest):
                                           port_index=port_index)
 
     def _create_security_group_rules(self, amount, port_index=1):
-        for i in range(amount):
-            ingress_rule = self.create_security_group_rule(**{
-                'project_id': self.client.tenant_id,
-                'direction': 'ingress',
-                'port_range_max': port_index + i,
-                'port_range_min': port_index + i,
-                'protocol': 'tcp'})
+        ingress_rules = self.create_security_group_rules([{
+            'project_id': self.client.tenant_id,
+            'direction': 'ingress',
+            'port_range_max': port_index + i,
+            'port_range_min': port_index + i,
+            'protocol': 'tcp'} for i in range(amount)])
+        for ingress_rule in ingress_rules:
             self.addCleanup(
                 self.client.delete_security_group_rule, ingress_rule['id'])
 
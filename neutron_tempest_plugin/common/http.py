@@ -0,0 +1,128 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from tempest.lib.common import http
+from tempest.lib.common import rest_client
+
+from neutron_tempest_plugin import config
+
+
+CONF = config.CONF
+
+
+class _KeepAliveMixin(object):
+    """Keeps HTTP connections alive between requests
+
+    Differently from tempest.lib.common.http.ClosingHttp, it doesn't ask the
+    server to close the connection after every request and it doesn't clear
+    its connection pools. Connections (and their TLS sessions) are then
+    reused by following requests to the same endpoint.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_KeepAliveMixin, self).__init__(*args, **kwargs)
+        # Connections exceeding the pool size are closed once released
+        # instead of blocking requests waiting for a free connection
+        self.connection_pool_kw.update(
+            maxsize=CONF.neutron_plugin_options.http_connection_pool_size,
+            block=False)
+
+    def urlopen(self, method, url, *args, **kwargs):
+        headers = kwargs.get('headers')
+        if headers is not None and headers.get('connection') == 'close':
+            headers = headers.copy()
+            del headers['connection']
+            kwargs['headers'] = headers
+        return super(_KeepAliveMixin, self).urlopen(method, url, *args,
+                                                    **kwargs)
+
+    def clear(self):
+        # It is called after every request: connection pools are kept until
+        # close method is called
+        pass
+
+    def close(self):
+        """Closes all pooled connections"""
+        super(_KeepAliveMixin, self).clear()
+
+
+class KeepAliveHttp(_KeepAliveMixin, http.ClosingHttp):
+    pass
+
+
+class KeepAliveProxyHttp(_KeepAliveMixin, http.ClosingProxyHttp):
+    pass
+
+
+_SHARED_HTTP = {}
+_SHARED_HTTP_LOCK = threading.Lock()
+
+
+def get_shared_http(disable_ssl_certificate_validation=False, ca_certs=None,
+                    timeout=None, follow_redirects=True, proxy_url=None):
+    """Returns an HTTP client whose connection pools are shared
+
+    The same client is returned for the same parameters, so that every REST
+    client using it shares the same keep-alive connections to every API
+    endpoint.
+    """
+    key = (disable_ssl_certificate_validation, ca_certs, timeout,
+           follow_redirects, proxy_url)
+    with _SHARED_HTTP_LOCK:
+        http_obj = _SHARED_HTTP.get(key)
+        if http_obj is None:
+            kwargs = dict(
+                disable_ssl_certificate_validation=(
+                    disable_ssl_certificate_validation),
+                ca_certs=ca_certs, timeout=timeout,
+                follow_redirects=follow_redirects)
+            if proxy_url:
+                http_obj = KeepAliveProxyHttp(proxy_url, **kwargs)
+            else:
+                http_obj = KeepAliveHttp(**kwargs)
+            _SHARED_HTTP[key] = http_obj
+        return http_obj
+
+
+def _get_http_params(http_obj):
+    """Returns get_shared_http parameters matching given HTTP client"""
+    pool_kw = http_obj.connection_pool_kw
+    proxy = getattr(http_obj, 'proxy', None)
+    return dict(
+        disable_ssl_certificate_validation=(
+            pool_kw.get('cert_reqs') == 'CERT_NONE'),
+        ca_certs=pool_kw.get('ca_certs'),
+        timeout=pool_kw.get('timeout'),
+        follow_redirects=http_obj.follow_redirects,
+        proxy_url=proxy and str(proxy))
+
+
+def share_http_connections(clients):
+    """Makes given REST clients share keep-alive HTTP connections
+
+    Every client gets a shared HTTP client created with the same parameters
+    (timeout, redirections, proxy and TLS settings) as its own.
+
+    :param clients: objects to be updated. Only instances of
+    tempest.lib.common.rest_client.RestClient using tempest HTTP clients are
+    actually updated.
+    """
+    for client in clients:
+        if not isinstance(client, rest_client.RestClient):
+            continue
+        http_obj = client.http_obj
+        if isinstance(http_obj, _KeepAliveMixin) or not isinstance(
+                http_obj, (http.ClosingHttp, http.ClosingProxyHttp)):
+            continue
+        client.http_obj = get_shared_http(**_get_http_params(http_obj))
@@ -14,7 +14,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
 import collections
+import json
+import os
 import re
 import subprocess
 
@@ -25,7 +28,9 @@ from oslo_utils import excutils
 from tempest.common import waiters
 
 from neutron_tempest_plugin.common import shell
+from neutron_tempest_plugin.common import tempest_fixtures
 from neutron_tempest_plugin.common import utils as common_utils
+from neutron_tempest_plugin import exceptions
 
 
 LOG = log.getLogger(__name__)
@@ -433,20 +438,278 @@ class ARPregister(collections.namedtuple(
                                       self.device)
 
 
+class CIDRAllocator(object):
+    """Allocates CIDRs out of a pool of addresses
+
+    Free addresses are kept as aligned blocks, buddy allocator style: for
+    every prefix length there is a sorted list with the first address of
+    every free block of that length. Allocating a CIDR takes the lowest free
+    block big enough to contain it and splits it, releasing a CIDR merges it
+    back with its free buddies.
+
+    :param cidr: the pool of addresses CIDRs are allocated from.
+    """
+
+    def __init__(self, cidr):
+        self.cidr = netaddr.IPNetwork(cidr).cidr
+        if self.cidr.version == constants.IP_VERSION_4:
+            self._width = 32
+        else:
+            self._width = 128
+        self._free = collections.defaultdict(list)
+        self._free[self.cidr.prefixlen].append(self.cidr.first)
+
+    def allocate(self, prefixlen):
+        """Allocates the lowest free CIDR with given prefix length
+
+        :raises NoFreeCIDR: if there is no such free CIDR left in the pool.
+        """
+        found = None
+        for length in range(self.cidr.prefixlen, prefixlen + 1):
+            blocks = self._free.get(length)
+            if blocks and (found is None or blocks[0] < found[0]):
+                found = blocks[0], length
+        if found is None:
+            raise exceptions.NoFreeCIDR(prefixlen=prefixlen, cidr=self.cidr)
+
+        first, length = found
+        del self._free[length][0]
+        while length < prefixlen:
+            length += 1
+            self._insert(length, first + self._size(length))
+        return netaddr.IPNetwork((first, prefixlen),
+                                 version=self.cidr.version)
+
+    def reserve(self, cidr):
+        """Marks every address of given CIDR as used
+
+        Addresses outside of the pool are ignored.
+
+        :returns: True if any of the addresses was free before.
+        """
+        network = self._clip(cidr)
+        return network is not None and self._take(network)
+
+    def release(self, cidr):
+        """Marks every address of given CIDR as free
+
+        Addresses outside of the pool are ignored.
+        """
+        network = self._clip(cidr)
+        if network is None:
+            return
+        self._take(network)
+        first, length = network.first, network.prefixlen
+        while length > self.cidr.prefixlen:
+            buddy = first ^ self._size(length)
+            if not self._discard(length, buddy):
+                break
+            first = min(first, buddy)
+            length -= 1
+        self._insert(length, first)
+
+    def free_cidrs(self):
+        """Returns the sorted list of free blocks"""
+        blocks = sorted((first, length)
+                        for length, firsts in self._free.items()
+                        for first in firsts)
+        return [netaddr.IPNetwork(block, version=self.cidr.version)
+                for block in blocks]
+
+    def _clip(self, cidr):
+        network = netaddr.IPNetwork(cidr).cidr
+        if network.version != self.cidr.version:
+            return None
+        if network in self.cidr:
+            return network
+        if self.cidr in network:
+            return self.cidr
+        return None
+
+    def _take(self, network):
+        first, prefixlen = network.first, network.prefixlen
+        # A bigger free block containing the network is split, giving back
+        # the halves that don't contain it
+        for length in range(self.cidr.prefixlen, prefixlen):
+            start = first & ~(self._size(length) - 1)
+            if self._discard(length, start):
+                while length < prefixlen:
+                    length += 1
+                    size = self._size(length)
+                    if first >= start + size:
+                        self._insert(length, start)
+                        start += size
+                    else:
+                        self._insert(length, start + size)
+                return True
+
+        # Otherwise free blocks inside the network are removed
+        taken = False
+        for length in range(prefixlen, self._width + 1):
+            blocks = self._free.get(length)
+            if blocks:
+                low = bisect.bisect_left(blocks, first)
+                high = bisect.bisect_right(blocks, network.last)
+                if low < high:
+                    del blocks[low:high]
+                    taken = True
+        return taken
+
+    def _size(self, length):
+        return 1 << (self._width - length)
+
+    def _insert(self, length, first):
+        bisect.insort(self._free[length], first)
+
+    def _discard(self, length, first):
+        blocks = self._free.get(length)
+        if blocks:
+            index = bisect.bisect_left(blocks, first)
+            if index < len(blocks) and blocks[index] == first:
+                del blocks[index]
+                return True
+        return False
+
+
+class SharedCIDRAllocator(object):
+    """Allocates CIDRs not overlapping among test worker processes
+
+    Allocated CIDRs are stored in a JSON file together with the ID of the
+    process they have been allocated by. The file is only accessed while
+    holding an external lock, so every process running on the same host
+    sees allocations made by others. Allocations made by processes that
+    are not running any more are considered released.
+
+    :param path: the file allocations are stored into.
+    """
+
+    lock_name = 'neutron-tempest-plugin-cidrs'
+
+    def __init__(self, path):
+        self.path = path
+
+    def allocate(self, pool, prefixlen, used=None):
+        """Allocates the lowest free CIDR of given pool and prefix length
+
+        :param used: optional CIDRs not to be allocated in addition to the
+        ones allocated by any process.
+
+        :raises NoFreeCIDR: if there is no such free CIDR left in the pool.
+        """
+        allocator = CIDRAllocator(pool)
+        for cidr in used or []:
+            allocator.reserve(cidr)
+        with tempest_fixtures.LockFixture(self.lock_name):
+            allocations = self._load()
+            for cidrs in allocations.values():
+                for cidr in cidrs:
+                    allocator.reserve(cidr)
+            cidr = allocator.allocate(prefixlen)
+            allocations.setdefault(str(os.getpid()), []).append(str(cidr))
+            self._save(allocations)
+        return cidr
+
+    def reserve(self, cidrs):
+        """Marks given CIDRs as allocated by this process"""
+        self._update(added=cidrs)
+
+    def release(self, cidrs):
+        """Releases given CIDRs allocated by this process"""
+        self._update(removed=cidrs)
+
+    def _update(self, added=(), removed=()):
+        pid = str(os.getpid())
+        with tempest_fixtures.LockFixture(self.lock_name):
+            allocations = self._load()
+            owned = set(allocations.pop(pid, []))
+            owned.update(str(netaddr.IPNetwork(cidr).cidr) for cidr in added)
+            owned.difference_update(str(netaddr.IPNetwork(cidr).cidr)
+                                    for cidr in removed)
+            if owned:
+                allocations[pid] = sorted(owned)
+            self._save(allocations)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                allocations = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {pid: cidrs for pid, cidrs in allocations.items()
+                if _is_process_running(int(pid))}
+
+    def _save(self, allocations):
+        path = '%s.%d' % (self.path, os.getpid())
+        with open(path, 'w') as f:
+            json.dump(allocations, f)
+        os.replace(path, self.path)
+
+
+def _is_process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def iter_unused_addresses(ranges, used):
+    """Yields addresses of given ranges that are not used
+
+    Runs of consecutive used addresses are skipped with a binary search, so
+    finding the next unused address doesn't depend on how many addresses
+    are used before it.
+
+    :param ranges: iterable of (first, last) pairs of integer addresses.
+    :param used: iterable of used integer addresses.
+    """
+    used = sorted(set(used))
+    for first, last in ranges:
+        address = first
+        index = bisect.bisect_left(used, address)
+        while address <= last:
+            if index < len(used) and used[index] == address:
+                index = _find_end_of_run(used, index)
+                address = used[index - 1] + 1
+                continue
+            if index < len(used):
+                end = min(last, used[index] - 1)
+            else:
+                end = last
+            for unused in range(address, end + 1):
+                yield unused
+            address = end + 1
+
+
+def _find_end_of_run(used, index):
+    # Inside a run of consecutive addresses used[i] - i doesn't change,
+    # while it grows after every gap
+    offset = used[index] - index
+    low, high = index + 1, len(used)
+    while low < high:
+        middle = (low + high) // 2
+        if used[middle] - middle > offset:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
 def find_valid_cidr(valid_cidr='10.0.0.0/8', used_cidr=None):
-    total_ips = netaddr.IPSet(netaddr.IPNetwork(valid_cidr))
+    allocator = CIDRAllocator(valid_cidr)
     if used_cidr:
         used_network = netaddr.IPNetwork(used_cidr)
-        netmask = used_network.netmask.netmask_bits()
-        valid_ips = total_ips.difference(netaddr.IPSet(used_network))
+        netmask = used_network.prefixlen
+        allocator.reserve(used_network)
     else:
-        valid_ips = total_ips
         netmask = 24
 
-    for ip in valid_ips:
-        valid_network = netaddr.IPNetwork('%s/%s' % (ip, netmask))
-        if valid_network in valid_ips:
-            return valid_network.cidr
+    try:
+        return allocator.allocate(netmask)
+    except exceptions.NoFreeCIDR:
+        pass
 
     exception_str = 'No valid CIDR found in %s' % valid_cidr
     if used_cidr:
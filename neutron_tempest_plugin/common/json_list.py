@@ -0,0 +1,193 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import codecs
+import json
+
+from oslo_serialization import jsonutils
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(body):
+    """Decodes a JSON document using the fastest available backend"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return jsonutils.loads(body)
+
+
+def split_list(res):
+    """Splits a decoded list response into its resources and links
+
+    Responses are expected to be in form:
+    {'resources': [res1, res2]} => when pagination is disabled
+    {'resources': [..], 'resources_links': [..]} => when pagination is enabled
+
+    :returns: a tuple with the list of resources (or None if not found) and a
+    dictionary mapping links relation to their URL
+    """
+    resources = None
+    links = {}
+    for key, value in res.items():
+        if key.endswith("_links"):
+            links = {link['rel']: link['href'] for link in value}
+        elif resources is None:
+            resources = value
+    return resources, links
+
+
+class ListDecoder(object):
+    """Decodes resources of a list response while it is being received
+
+    Iterating over it yields resources from the first list of the response
+    as soon as they are decoded, without keeping in memory neither the whole
+    response body nor the list of resources. Once the iteration is over,
+    links found in the response are available as 'links' attribute.
+
+    :param chunks: iterable of bytes the response body is made of.
+    :param response: optional HTTP response object released when
+    the iteration is over or closed when the decoder is closed before.
+    """
+
+    # Buffered text already decoded is discarded every time it exceeds this
+    # size
+    compact_size = 65536
+
+    _number_chars = frozenset('+-.0123456789Ee')
+
+    def __init__(self, chunks, response=None):
+        self.links = {}
+        self._chunks = iter(chunks)
+        self._response = response
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._items = None
+
+    def __iter__(self):
+        if self._items is None:
+            self._items = self._decode()
+        return self._items
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._items is not None:
+            self._items.close()
+        self._release(completed=self._eof)
+
+    def _release(self, completed):
+        response, self._response = self._response, None
+        if response is not None:
+            if not completed:
+                # Remaining data can't be left on a reusable connection
+                response.close()
+            response.release_conn()
+
+    def _decode(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+        else:
+            found = False
+            while True:
+                key = self._value()
+                self._expect(':')
+                if key.endswith('_links'):
+                    self.links = {link['rel']: link['href']
+                                  for link in self._value()}
+                elif not found and self._peek() == '[':
+                    found = True
+                    for item in self._list():
+                        yield item
+                else:
+                    self._value()
+                if self._expect(',', '}') == '}':
+                    break
+        if self._peek() is not None:
+            self._error('Extra data')
+        self._release(completed=True)
+
+    def _list(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',', ']') == ']':
+                return
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer,
+                                                           self._pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            if not self._maybe_truncated(value, end) or not self._read():
+                break
+        self._pos = end
+        if self._pos > self.compact_size:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        return value
+
+    def _maybe_truncated(self, value, end):
+        # Only numbers can be decoded from a truncated buffer
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        return (end == len(self._buffer) or
+                self._buffer[end] in self._number_chars)
+
+    def _read(self):
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self._buffer += text
+                return True
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer):
+                if not self._buffer[self._pos].isspace():
+                    return self._buffer[self._pos]
+                self._pos += 1
+            if not self._read():
+                return None
+
+    def _expect(self, *delimiters):
+        char = self._peek()
+        if char not in delimiters:
+            self._error('Expecting %s delimiter' % ' or '.join(
+                repr(delimiter) for delimiter in delimiters))
+        self._pos += 1
+        return char
+
+    def _error(self, message):
+        raise json.JSONDecodeError(message, self._buffer, self._pos)
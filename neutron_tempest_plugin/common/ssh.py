@@ -12,10 +12,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import atexit
+import base64
+import codecs
+import collections
+import contextlib
+import hashlib
 import locale
 import os
+import random
+import select
+import shlex
 import socket
+import threading
 import time
+import weakref
 
 from oslo_log import log
 import paramiko
@@ -23,6 +34,7 @@ from tempest.lib.common import ssh
 from tempest.lib import exceptions
 import tenacity
 
+from neutron_tempest_plugin.common import utils
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin import exceptions as exc
 
@@ -35,6 +47,227 @@ RETRY_EXCEPTIONS = (exceptions.TimeoutException, paramiko.SSHException,
                     socket.error, TimeoutError)
 
 
+def retry_policy(attempts=10, wait=1., max_wait=None, jitter=0.):
+    """Creates a retry policy for SSH client operations
+
+    :param attempts: maximum number of attempts.
+    :param wait: time in seconds to wait before retrying. When max_wait is
+    given, it is the initial time of an exponentially growing wait time.
+    :param max_wait: maximum time in seconds to wait before retrying.
+    :param jitter: maximum random time in seconds added to wait time.
+    :returns: parameters for tenacity.Retrying
+    """
+    if max_wait:
+        wait_strategy = tenacity.wait_exponential(multiplier=wait,
+                                                  max=max_wait)
+    else:
+        wait_strategy = tenacity.wait_fixed(wait)
+    if jitter:
+        wait_strategy += tenacity.wait_random(0, jitter)
+    return dict(stop=tenacity.stop_after_attempt(attempts),
+                wait=wait_strategy,
+                retry=tenacity.retry_if_exception_type(RETRY_EXCEPTIONS),
+                reraise=True)
+
+
+DEFAULT_RETRY_POLICY = retry_policy()
+NO_RETRY_POLICY = retry_policy(attempts=1)
+
+
+class _PooledConnection(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.time()
+        # Channels opened on this connection: it is not going to be evicted
+        # while any of them is still open
+        self.channels = weakref.WeakSet()
+
+    @property
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active() and
+                    transport.is_authenticated())
+
+    @property
+    def is_busy(self):
+        return any(not channel.closed for channel in list(self.channels))
+
+    def touch(self):
+        self.last_used = time.time()
+
+
+class ConnectionPool(object):
+    """Process-wide pool of authenticated SSH connections
+
+    Connections are indexed by a key identifying remote host, port, user and
+    credentials (see Client.pool_key). Pooled connections are health checked
+    before being handed out and closed after being left unused for more than
+    idle_timeout seconds.
+    """
+
+    def __init__(self, idle_timeout=60., keepalive_interval=15):
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, connect):
+        """Returns a pooled connection, creating it when required
+
+        :param key: hashable connection identifier.
+        :param connect: callable creating a new paramiko.SSHClient when no
+        live connection is found for given key.
+        :returns: connected paramiko.SSHClient that must not be closed by
+        the caller.
+        """
+        with self._lock:
+            self._evict_idle_connections()
+            connection = self._connections.get(key)
+        if connection is not None:
+            if connection.is_alive:
+                connection.touch()
+                return connection.client
+            LOG.debug("Discarding broken pooled SSH connection %r", key)
+            self.discard(key, connection.client)
+        return self.put(key, connect())
+
+    def put(self, key, client):
+        """Adds a connected paramiko.SSHClient to the pool
+
+        If a live connection has meanwhile been pooled for the same key, the
+        given client is closed and the pooled one is returned instead.
+        """
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is not None and connection.is_alive:
+                if connection.client is not client:
+                    client.close()
+                connection.touch()
+                return connection.client
+            transport = client.get_transport()
+            if transport and self.keepalive_interval:
+                transport.set_keepalive(self.keepalive_interval)
+            self._connections[key] = _PooledConnection(client)
+            return client
+
+    def register_channel(self, key, channel):
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is not None:
+                connection.channels.add(channel)
+                connection.touch()
+
+    def discard(self, key, client=None):
+        """Removes connection from the pool and closes it"""
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None or (client is not None and
+                                      connection.client is not client):
+                connection = None
+            else:
+                del self._connections[key]
+        if client is not None:
+            client.close()
+        elif connection is not None:
+            connection.client.close()
+
+    def close_all(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.client.close()
+
+    def _evict_idle_connections(self):
+        # Caller must hold self._lock
+        oldest_allowed = time.time() - self.idle_timeout
+        for key, connection in list(self._connections.items()):
+            if (connection.last_used < oldest_allowed and
+                    not connection.is_busy):
+                LOG.debug("Closing idle pooled SSH connection %r", key)
+                del self._connections[key]
+                connection.client.close()
+
+
+CONNECTION_POOL = ConnectionPool(
+    idle_timeout=CONF.neutron_plugin_options.ssh_connection_pool_idle_timeout)
+atexit.register(CONNECTION_POOL.close_all)
+
+
+class TimingCollector(object):
+    """Collects time spent by SSH clients per remote host and operation
+
+    Recorded operations are:
+     - readiness_probe: waiting for remote SSH server to accept connections
+     - tcp_connect: connecting to remote SSH server (or tunneling through
+       the proxy jump host)
+     - kex: SSH protocol handshake and key exchange
+     - auth: user authentication
+     - connect_retry: waiting before retrying to connect
+     - channel_open: opening a new channel on an established connection
+     - exec: executing a command or a script
+     - exec_retry: waiting before retrying to execute a command
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._timings = {}
+
+    def record(self, host, operation, duration):
+        if not self.enabled:
+            return
+        with self._lock:
+            timing = self._timings.setdefault(host, {}).setdefault(
+                operation, {'count': 0, 'total': 0., 'max': 0.})
+            timing['count'] += 1
+            timing['total'] += duration
+            timing['max'] = max(timing['max'], duration)
+
+    @contextlib.contextmanager
+    def measure(self, host, operation):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.record(host, operation, time.time() - start_time)
+
+    def pop_summary(self):
+        """Returns collected timings and resets them
+
+        :returns: dictionary like {host: {operation: {'count': <int>,
+        'total': <seconds>, 'max': <seconds>}}}
+        """
+        with self._lock:
+            timings, self._timings = self._timings, {}
+        for operations in timings.values():
+            for timing in operations.values():
+                timing['total'] = round(timing['total'], 3)
+                timing['max'] = round(timing['max'], 3)
+        return timings
+
+
+TIMINGS = TimingCollector(enabled=CONF.neutron_plugin_options.ssh_timings)
+
+# Size of file content chunks written with shell commands when SFTP is not
+# available: base64 encoded chunks must fit in a single command argument
+SHELL_FILE_CHUNK_SIZE = 48 * 1024
+
+
+class _TimedSSHClient(paramiko.SSHClient):
+    """paramiko.SSHClient keeping track of the time spent authenticating"""
+
+    auth_time = 0.
+
+    def _auth(self, *args, **kwargs):
+        start_time = time.time()
+        try:
+            return super(_TimedSSHClient, self)._auth(*args, **kwargs)
+        finally:
+            self.auth_time = time.time() - start_time
+
+
 class Client(ssh.Client):
 
     default_ssh_lang = 'en_US.UTF-8'
@@ -47,11 +280,35 @@ class Client(ssh.Client):
     proxy_jump_keyfile = CONF.neutron_plugin_options.ssh_proxy_jump_keyfile
     proxy_jump_port = CONF.neutron_plugin_options.ssh_proxy_jump_port
 
+    connection_pool = CONNECTION_POOL
+    use_connection_pool = CONF.neutron_plugin_options.ssh_connection_pool
+
+    use_remote_agent = CONF.neutron_plugin_options.ssh_remote_agent
+
+    use_readiness_probe = CONF.neutron_plugin_options.ssh_readiness_probe
+
+    # Retry policy of exec_command method
+    retry_policy = DEFAULT_RETRY_POLICY
+
     def __init__(self, host, username, password=None, timeout=None, pkey=None,
                  channel_timeout=10, look_for_keys=False, key_filename=None,
-                 port=22, proxy_client=None, create_proxy_client=True):
+                 port=22, proxy_client=None, create_proxy_client=True,
+                 use_connection_pool=None, use_remote_agent=None,
+                 use_readiness_probe=None, retry_policy=None):
 
         timeout = timeout or self.timeout
+        if use_connection_pool is not None:
+            self.use_connection_pool = use_connection_pool
+        if use_remote_agent is not None:
+            self.use_remote_agent = use_remote_agent
+        if use_readiness_probe is not None:
+            self.use_readiness_probe = use_readiness_probe
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self._remote_agent = None
+        self._remote_agent_finalizer = None
+        self._remote_agent_lock = threading.Lock()
+        self._sftp_unavailable = False
 
         if not proxy_client and create_proxy_client and self.proxy_jump_host:
             # Perform all SSH connections passing through configured SSH server
@@ -121,35 +378,319 @@ class Client(ssh.Client):
                         "set 'proxy_jump_keyfile' to provide a valid SSH key "
                         "file.", login)
 
+        # The connection to the proxy jump host is shared by all clients: it
+        # is going to be closed only when no tunnel is open on it
+        kwargs.setdefault('use_connection_pool', True)
         return Client(
             host=host, username=username, password=password,
             look_for_keys=look_for_keys, key_filename=key_file,
             port=port, create_proxy_client=False, **kwargs)
 
+    @property
+    def pool_key(self):
+        """Identifies connections that can be shared between clients
+
+        Credentials are only included as a digest, so that the key can be
+        logged.
+        """
+        pkey = self.pkey and self.pkey.get_base64()
+        credentials = hashlib.sha256(repr(
+            (self.password, pkey, self.key_filename,
+             self.look_for_keys)).encode('utf-8')).hexdigest()
+        proxy_key = None
+        if self.proxy_client is not None:
+            proxy_key = getattr(self.proxy_client, 'pool_key',
+                                id(self.proxy_client))
+        return (self.host, self.port, self.username, credentials, proxy_key)
+
     def connect(self, *args, **kwargs):
         """Creates paramiko.SSHClient and connect it to remote SSH server
 
+        A new connection is always created, so that this method can be used
+        to verify remote SSH server is reachable. The new connection is then
+        added to the connection pool when pooling is enabled.
+
         :returns: paramiko.Client connected to remote server.
 
         :raises tempest.lib.exceptions.SSHTimeout: in case it fails to connect
         to remote server.
         """
-        return super(Client, self)._get_ssh_connection(*args, **kwargs)
+        client = self._get_ssh_connection(*args, **kwargs)
+        if self.use_connection_pool:
+            client = self.connection_pool.put(self.pool_key, client)
+        return client
 
     # This overrides superclass test_connection_auth method forbidding it to
     # close connection
     test_connection_auth = connect
 
+    def _get_connection(self):
+        """Gets a pooled connection or creates a new one"""
+        if self.use_connection_pool:
+            return self.connection_pool.get(self.pool_key,
+                                            self._get_ssh_connection)
+        return self._get_ssh_connection()
+
+    def _get_ssh_connection(self, sleep=1.5, backoff=1):
+        """Returns an ssh connection to the specified host
+
+        Differently from the superclass method it waits for remote SSH server
+        to be ready before trying to connect to it, and it records the time
+        spent connecting, exchanging keys and authenticating to TIMINGS.
+        Waiting for remote SSH server and connecting to it share the same
+        client timeout.
+        """
+        bsleep = sleep
+        start_time = time.time()
+        if self.use_readiness_probe:
+            with TIMINGS.measure(self.host, 'readiness_probe'):
+                self.wait_for_ssh_server()
+
+        if self.pkey is not None:
+            LOG.info("Creating ssh connection to '%s:%d' as '%s'"
+                     " with public key authentication",
+                     self.host, self.port, self.username)
+        else:
+            LOG.info("Creating ssh connection to '%s:%d' as '%s'"
+                     " with password %s",
+                     self.host, self.port, self.username, str(self.password))
+        attempts = 0
+        while True:
+            ssh = _TimedSSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            sock = None
+            try:
+                with TIMINGS.measure(self.host, 'tcp_connect'):
+                    sock = self._open_socket()
+                connect_start_time = time.time()
+                ssh.connect(self.host, port=self.port, username=self.username,
+                            password=self.password,
+                            look_for_keys=self.look_for_keys,
+                            key_filename=self.key_filename,
+                            timeout=self.channel_timeout, pkey=self.pkey,
+                            sock=sock,
+                            allow_agent=getattr(self, 'ssh_allow_agent',
+                                                True))
+                TIMINGS.record(self.host, 'kex',
+                               time.time() - connect_start_time -
+                               ssh.auth_time)
+                TIMINGS.record(self.host, 'auth', ssh.auth_time)
+                LOG.info("ssh connection to %s@%s successfully created",
+                         self.username, self.host)
+                return ssh
+            except (EOFError,
+                    socket.error, socket.timeout,
+                    paramiko.SSHException) as e:
+                ssh.close()
+                if sock is not None:
+                    sock.close()
+                if self._is_timed_out(start_time):
+                    LOG.exception("Failed to establish authenticated ssh"
+                                  " connection to %s@%s after %d attempts. "
+                                  "Proxy client: %s",
+                                  self.username, self.host, attempts,
+                                  self._get_proxy_client_info())
+                    raise exceptions.SSHTimeout(host=self.host,
+                                                user=self.username,
+                                                password=self.password)
+                bsleep += backoff
+                attempts += 1
+                LOG.warning("Failed to establish authenticated ssh"
+                            " connection to %s@%s (%s). Number attempts: %s."
+                            " Retry after %d seconds.",
+                            self.username, self.host, e, attempts, bsleep)
+                TIMINGS.record(self.host, 'connect_retry', bsleep)
+                time.sleep(bsleep)
+
+    def _open_socket(self):
+        if self.proxy_client is not None:
+            return self._get_proxy_channel()
+        return socket.create_connection((self.host, self.port),
+                                        timeout=self.channel_timeout)
+
+    def wait_for_ssh_server(self, timeout=None, initial_delay=.1,
+                            max_delay=3.):
+        """Waits until remote SSH server accepts connections
+
+        It probes remote server by connecting to its TCP port and by reading
+        its SSH protocol banner, which is much cheaper than trying to
+        establish an authenticated connection. Between failed probes it waits
+        for an exponentially growing random time.
+
+        :param timeout: time in seconds to wait for. By default it is client
+        timeout.
+        :raises tempest.lib.exceptions.SSHTimeout: when timeout expires.
+        """
+        timeout = timeout or self.timeout
+        end_of_time = time.time() + timeout
+        delay = initial_delay
+        attempts = 0
+        while True:
+            attempts += 1
+            remaining_time = end_of_time - time.time()
+            try:
+                self._probe_ssh_server(
+                    timeout=max(min(self.channel_timeout, remaining_time),
+                                .1))
+            except (EOFError, socket.error, paramiko.SSHException) as ex:
+                remaining_time = end_of_time - time.time()
+                if remaining_time <= 0.:
+                    LOG.error("SSH server %s:%d is not ready after %d "
+                              "attempts (%s)", self.host, self.port,
+                              attempts, ex)
+                    raise exceptions.SSHTimeout(host=self.host,
+                                                user=self.username,
+                                                password=self.password)
+                LOG.debug("SSH server %s:%d is not ready yet (%s)",
+                          self.host, self.port, ex)
+                time.sleep(min(random.uniform(delay / 2., delay),
+                               remaining_time))
+                delay = min(delay * 2., max_delay)
+            else:
+                LOG.debug("SSH server %s:%d is ready after %d attempt(s)",
+                          self.host, self.port, attempts)
+                return
+
+    def _probe_ssh_server(self, timeout):
+        if self.proxy_client is None:
+            sock = socket.create_connection((self.host, self.port),
+                                            timeout=timeout)
+        elif isinstance(self.proxy_client, Client):
+            # Probing through netcat would cost a new connection to the proxy
+            # for every probe: the probe is skipped when the proxy doesn't
+            # forward TCP connections
+            proxy_key = self.proxy_client.pool_key
+            if proxy_key in self._tcp_forwarding_refused:
+                return
+            try:
+                sock = self.proxy_client._open_forwarded_channel(self.host,
+                                                                 self.port)
+            except paramiko.ChannelException as ex:
+                if ex.code != paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED:
+                    # Remote server is not ready yet
+                    raise
+                self._tcp_forwarding_refused.add(proxy_key)
+                return
+            sock.settimeout(timeout)
+        else:
+            # Remote server can't be reached without connecting to proxy
+            return
+        with sock:
+            banner = sock.recv(256)
+        if not banner:
+            raise EOFError("connection closed by SSH server")
+        if not banner.startswith(b'SSH-'):
+            raise paramiko.SSHException(
+                "invalid SSH protocol banner: {!r}".format(banner))
+
+    def _open_channel(self, kind='session', **kwargs):
+        """Opens a new paramiko.Channel on a (pooled) connection
+
+        When opening a channel on a pooled connection fails, such connection
+        is discarded and the channel is opened on a new one.
+
+        :param kind: kind of channel to open ('session' or 'direct-tcpip')
+
+        :param **kwargs: other parameters for paramiko.Transport.open_channel
+
+        :returns: (paramiko.SSHClient, paramiko.Channel) tuple
+        """
+        client = self._get_connection()
+        try:
+            with TIMINGS.measure(self.host, 'channel_open'):
+                channel = client.get_transport().open_channel(
+                    kind, timeout=self.channel_timeout, **kwargs)
+        except paramiko.ChannelException:
+            # Remote server refused to open the channel, but the connection
+            # is still usable
+            self._close_connection(client)
+            raise
+        except (EOFError, socket.error, paramiko.SSHException):
+            if not self.use_connection_pool:
+                client.close()
+                raise
+            LOG.debug("Unable to open SSH channel on pooled connection to "
+                      "%s@%s:%d, reconnecting", self.username, self.host,
+                      self.port)
+            self.connection_pool.discard(self.pool_key, client)
+            client = self._get_connection()
+            with TIMINGS.measure(self.host, 'channel_open'):
+                channel = client.get_transport().open_channel(
+                    kind, timeout=self.channel_timeout, **kwargs)
+        if self.use_connection_pool:
+            self.connection_pool.register_channel(self.pool_key, channel)
+        return client, channel
+
+    # Pool keys of SSH servers which refused to forward TCP connections
+    _tcp_forwarding_refused = set()
+
+    def open_tunnel(self, host, port):
+        """Opens a channel connected to given address by remote SSH server
+
+        Tunnels are opened as 'direct-tcpip' channels on the same (pooled)
+        connection, so that they are all multiplexed on it. In case remote
+        server refuses to forward TCP connections, it executes netcat on a
+        dedicated connection.
+
+        :returns: paramiko.Channel (or an object behaving like it) that can
+        be used as a socket.
+        """
+        if self.pool_key not in self._tcp_forwarding_refused:
+            try:
+                return self._open_forwarded_channel(host, port)
+            except paramiko.ChannelException as ex:
+                if ex.code != paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED:
+                    # Remote host is probably not reachable yet: the caller
+                    # is going to retry on the same connection
+                    raise socket.error(
+                        "SSH server {}:{:d} failed to connect to {}:{:d} "
+                        "({})".format(self.host, self.port, host, port, ex))
+                LOG.debug("SSH server %s:%d refused TCP forwarding, "
+                          "going to use netcat to connect to %s:%d",
+                          self.host, self.port, host, port)
+                self._tcp_forwarding_refused.add(self.pool_key)
+
+        return self._open_netcat_tunnel(host, port)
+
+    def _open_forwarded_channel(self, host, port):
+        return self._open_channel(
+            'direct-tcpip', dest_addr=(host, port),
+            src_addr=('127.0.0.1', 0))[1]
+
+    def _open_netcat_tunnel(self, host, port):
+        # Every netcat tunnel keeps a session open for as long as it is
+        # used: multiplexing them on the pooled connection would soon exceed
+        # the number of sessions allowed per connection by remote server
+        # (sshd MaxSessions), so each of them gets its own connection.
+        client = self._get_ssh_connection()
+        try:
+            with TIMINGS.measure(self.host, 'channel_open'):
+                channel = client.get_transport().open_session(
+                    timeout=self.channel_timeout)
+            channel.exec_command('nc %s %s' % (host, port))
+        except Exception:
+            client.close()
+            raise
+        return _NetcatTunnel(client, channel)
+
+    def _get_proxy_channel(self):
+        if not isinstance(self.proxy_client, Client):
+            return super(Client, self)._get_proxy_channel()
+        return self.proxy_client.open_tunnel(self.host, self.port)
+
+    def _close_connection(self, client):
+        """Closes given connection unless it is owned by the pool"""
+        if not self.use_connection_pool:
+            client.close()
+
     def open_session(self):
         """Gets connection to SSH server and open a new paramiko.Channel
 
         :returns: new paramiko.Channel
         """
 
-        client = self.connect()
-
         try:
-            return client.get_transport().open_session()
+            return self._open_channel()[1]
         except paramiko.SSHException:
             # the request is rejected, the session ends prematurely or
             # there is a timeout opening a channel
@@ -158,26 +699,156 @@ class Client(ssh.Client):
                                         user=self.username,
                                         password=self.password)
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(10),
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(RETRY_EXCEPTIONS),
-        reraise=True)
-    def exec_command(self, cmd, encoding="utf-8", timeout=None):
+    def exec_command(self, cmd, encoding="utf-8", timeout=None,
+                     retry_policy=None):
+        """Execute the specified command on the server
+
+        :param retry_policy: retry policy (see retry_policy function) to be
+        used instead of client one.
+        """
+        retrying = tenacity.Retrying(before_sleep=self._record_exec_retry,
+                                     **(retry_policy or self.retry_policy))
+        return retrying(self._exec_command_with_timeout, cmd=cmd,
+                        encoding=encoding, timeout=timeout)
+
+    def _record_exec_retry(self, retry_state):
+        TIMINGS.record(self.host, 'exec_retry', retry_state.next_action.sleep)
+
+    def _exec_command_with_timeout(self, cmd, encoding="utf-8",
+                                   timeout=None):
         if timeout:
             original_timeout = self.timeout
             self.timeout = timeout
         try:
-            return super(Client, self).exec_command(cmd=cmd, encoding=encoding)
+            with TIMINGS.measure(self.host, 'exec'):
+                return self._exec_command(cmd=cmd, encoding=encoding)
         finally:
             if timeout:
                 self.timeout = original_timeout
 
+    def _exec_command(self, cmd, encoding="utf-8"):
+        """Execute the specified command on the server
+
+        It is the same as superclass exec_command method, but it opens the
+        channel on a pooled connection and it doesn't close it. When remote
+        agent is enabled and available, command is sent to it instead.
+        """
+        agent = self._get_remote_agent()
+        if agent is not None:
+            try:
+                exit_status, out_data, err_data = agent.execute(
+                    cmd, timeout=self.timeout)
+            except exceptions.TimeoutException:
+                # Agent is still executing the command: a new one is going
+                # to be started for next command
+                self.close_remote_agent()
+                raise
+            except exc.RemoteAgentError as ex:
+                LOG.warning("%s. Going to execute command %r without it.",
+                            ex, cmd)
+                self.close_remote_agent()
+            else:
+                return _check_command_result(
+                    cmd, exit_status, out_data, err_data, encoding)
+
+        client, channel = self._open_channel()
+        try:
+            with channel:
+                channel.fileno()  # Register event pipe
+                channel.exec_command(cmd)
+                channel.shutdown_write()
+
+                # If the executing host is linux-based, poll the channel
+                if self._can_system_poll():
+                    out_data_chunks = []
+                    err_data_chunks = []
+                    poll = select.poll()
+                    poll.register(channel, select.POLLIN)
+                    start_time = time.time()
+
+                    while True:
+                        ready = poll.poll(self.channel_timeout)
+                        if not any(ready):
+                            if not self._is_timed_out(start_time):
+                                continue
+                            raise exceptions.TimeoutException(
+                                "Command: '{0}' executed on host "
+                                "'{1}'.".format(cmd, self.host))
+                        if not ready[0]:  # If there is nothing to read.
+                            continue
+                        out_chunk = err_chunk = None
+                        if channel.recv_ready():
+                            out_chunk = channel.recv(self.buf_size)
+                            out_data_chunks.append(out_chunk)
+                        if channel.recv_stderr_ready():
+                            err_chunk = channel.recv_stderr(self.buf_size)
+                            err_data_chunks.append(err_chunk)
+                        if not err_chunk and not out_chunk:
+                            break
+                    out_data = b''.join(out_data_chunks)
+                    err_data = b''.join(err_data_chunks)
+                # Just read from the channels
+                else:
+                    out_file = channel.makefile('rb', self.buf_size)
+                    err_file = channel.makefile_stderr('rb', self.buf_size)
+                    out_data = out_file.read()
+                    err_data = err_file.read()
+
+                exit_status = channel.recv_exit_status()
+        finally:
+            self._close_connection(client)
+
+        return _check_command_result(
+            cmd, exit_status, out_data, err_data, encoding)
+
+    def _get_remote_agent(self):
+        """Returns remote agent, starting it when required
+
+        :returns: _RemoteAgent instance or None when remote agent is
+        disabled or it is not available on remote host.
+        """
+        if not self.use_remote_agent:
+            return None
+        with self._remote_agent_lock:
+            if self._remote_agent is None:
+                agent = _RemoteAgent(self.host)
+                try:
+                    agent.start(self.open_session,
+                                timeout=self.channel_timeout)
+                except exc.RemoteAgentError as ex:
+                    LOG.info("%s. Commands are going to be executed without "
+                             "remote agent.", ex)
+                    self.use_remote_agent = False
+                    return None
+                self._remote_agent = agent
+                # The agent channel keeps its (pooled) connection busy: make
+                # sure it is closed when this client is garbage collected
+                self._remote_agent_finalizer = weakref.finalize(
+                    self, agent.close)
+            return self._remote_agent
+
+    def close_remote_agent(self):
+        """Terminates remote agent, if any"""
+        with self._remote_agent_lock:
+            finalizer, self._remote_agent_finalizer = (
+                self._remote_agent_finalizer, None)
+            self._remote_agent = None
+        if finalizer is not None:
+            finalizer()
+
+    def close(self):
+        """Releases remote resources held by this client
+
+        Pooled connections are not closed, as they are owned by the pool.
+        """
+        self.close_remote_agent()
+
     def execute_script(self, script, become_root=False, combine_stderr=False,
-                       shell='sh -eux', timeout=None, **params):
+                       shell='sh -eux', timeout=None, on_stdout=None,
+                       on_stderr=None, **params):
         """Connect to remote machine and executes script.
 
-        Implementation note: it passes script lines to shell interpreter via
+        Implementation note: it passes the script to shell interpreter via
         STDIN. Therefore script line number could be not available to some
         script interpreters for debugging porposes.
 
@@ -197,6 +868,13 @@ class Client(ssh.Client):
         :param timeout: time in seconds to wait before brutally aborting
         script execution.
 
+        :param on_stdout: callable receiving every line written by script to
+        STDOUT (without line terminator) as soon as it is received. When it
+        returns a true value script execution is interrupted and output
+        written to STDOUT until then is returned.
+
+        :param on_stderr: same as on_stdout, but for lines written to STDERR.
+
         :param **params: script parameter values to be assigned at the
         beginning of the script.
 
@@ -209,89 +887,758 @@ class Client(ssh.Client):
         script exits with non zero exit status or times out.
         """
 
+        execution = self._start_script(
+            script, become_root=become_root, combine_stderr=combine_stderr,
+            shell=shell, timeout=timeout, **params)
+        with execution:
+            if on_stdout or on_stderr:
+                callbacks = {STDOUT: on_stdout, STDERR: on_stderr}
+                for stream, line in execution.iter_lines(
+                        stdout=bool(on_stdout), stderr=bool(on_stderr)):
+                    if callbacks[stream](line):
+                        LOG.debug("Interrupting script execution on host "
+                                  "%r", self.host)
+                        return execution.stdout
+            else:
+                for _ in execution.iter_output():
+                    pass
+        return execution.check()
+
+    def iter_script_lines(self, script, become_root=False,
+                          combine_stderr=False, shell='sh -eux',
+                          timeout=None, **params):
+        """Connect to remote machine and yields script output lines.
+
+        It works like execute_script method, but lines written by the script
+        to STDOUT are yielded (without line terminator) as soon as they are
+        received. Closing the generator (for example by breaking the loop
+        iterating over it) interrupts script execution.
+
+        :raises tempest.lib.exceptions.SSHExecCommandFailed: once every line
+        has been yielded, in case command script exits with non zero exit
+        status or times out.
+        """
+        execution = self._start_script(
+            script, become_root=become_root, combine_stderr=combine_stderr,
+            shell=shell, timeout=timeout, **params)
+        with execution:
+            for _, line in execution.iter_lines():
+                yield line
+        execution.check()
+
+    def stream_command(self, cmd, become_root=False, timeout=None):
+        """Executes a command on remote host streaming its output lines
+
+        The command is executed on a pseudo-terminal, so that lines it writes
+        to STDOUT and STDERR are received as soon as they are written. It
+        returns a context manager which yields an object that can be
+        iterated to get output lines (without line terminator), and whose
+        wait_for_line method reads output lines until one of them matches a
+        predicate. Exiting the context manager closes the channel, what
+        makes remote host hang up the pseudo-terminal and terminate the
+        command if it is still running.
+
+        Example::
+
+            with ssh_client.stream_command('tcpdump -c1 ...',
+                                           become_root=True) as tcpdump:
+                tcpdump.wait_for_line('listening on')
+                ...
+                self.assertIsNotNone(
+                    tcpdump.wait_for_line('1 packet captured', timeout=60))
+
+        :param cmd: command line to be executed by remote shell.
+
+        :param become_root: executes the command as root with sudo.
+
+        :param timeout: time in seconds to wait for each output line by
+        default. By default it is the client timeout. The command itself is
+        not limited in time, it is executed until the context manager exits.
+        """
+        command = cmd
+        if become_root:
+            command = 'sudo sh -c ' + shlex.quote(cmd)
+        return _CommandStream(client=self, script=cmd, shell=command,
+                              timeout=timeout or self.timeout,
+                              combine_stderr=True)
+
+    def _start_script(self, script, become_root=False, combine_stderr=False,
+                      shell='sh -eux', timeout=None, **params):
         if params:
             # Append script parameters at the beginning of the script
             header = ''.join(sorted(["{!s}={!s}\n".format(k, v)
                                      for k, v in params.items()]))
             script = header + '\n' + script
 
-        timeout = timeout or self.timeout
-        end_of_time = time.time() + timeout
-        output_data = b''
-        error_data = b''
-        exit_status = None
+        if become_root:
+            shell = 'sudo ' + shell
+
+        return _ScriptExecution(client=self, script=script, shell=shell,
+                                timeout=timeout or self.timeout,
+                                combine_stderr=combine_stderr)
+
+    def get_hostname(self):
+        """Retrieve the remote machine hostname"""
+        try:
+            return self.exec_command('hostname')
+        except exceptions.SSHExecCommandFailed:
+            return self.exec_command('cat /etc/hostname')
+
+    @contextlib.contextmanager
+    def open_sftp(self):
+        """Opens a SFTP session on the (pooled) connection
+
+        The session is closed when leaving the context, so that it doesn't
+        hold one of the sessions allowed per connection by remote server.
+
+        :returns: context manager yielding paramiko.SFTPClient or None when
+        SFTP subsystem is not available on remote host.
+        """
+        if self._sftp_unavailable:
+            yield None
+            return
+        client, channel = self._open_channel()
+        try:
+            channel.invoke_subsystem('sftp')
+            sftp = paramiko.SFTPClient(channel)
+        except paramiko.SSHException as ex:
+            LOG.info("SFTP subsystem not available on host %r (%s): "
+                     "files are going to be transferred using shell "
+                     "commands.", self.host, ex)
+            channel.close()
+            self._close_connection(client)
+            self._sftp_unavailable = True
+            yield None
+            return
+        try:
+            yield sftp
+        finally:
+            sftp.close()
+            self._close_connection(client)
+
+    def put_file(self, path, data, mode=None):
+        """Writes data to a file on remote host
+
+        :param path: remote file path.
+        :param data: file content as bytes or as a UTF-8 encodable string.
+        :param mode: file permissions to be set (for example 0o755).
+        """
+        self.put_files({path: data}, mode=mode)
+
+    def put_files(self, files, mode=None):
+        """Writes many files on remote host using a single SFTP session
+
+        :param files: mapping of remote file path to file content.
+        :param mode: file permissions to be set to every file.
+        """
+        with self.open_sftp() as sftp:
+            for path, data in sorted(files.items()):
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                if sftp is None:
+                    self._put_file_with_shell(path, data, mode=mode)
+                    continue
+                with sftp.open(path, 'wb') as remote_file:
+                    remote_file.write(data)
+                if mode is not None:
+                    sftp.chmod(path, mode)
+
+    def _put_file_with_shell(self, path, data, mode=None):
+        # Content is written in chunks to keep every command line below
+        # the maximum size of a command argument on remote host
+        quoted_path = shlex.quote(path)
+        self.exec_command(": > {}".format(quoted_path))
+        for offset in range(0, len(data), SHELL_FILE_CHUNK_SIZE):
+            chunk = data[offset:offset + SHELL_FILE_CHUNK_SIZE]
+            self.exec_command("echo {} | base64 -d >> {}".format(
+                base64.b64encode(chunk).decode(), quoted_path))
+        if mode is not None:
+            self.exec_command("chmod {:o} {}".format(mode, quoted_path))
+
+    def get_file(self, path, encoding='utf-8'):
+        """Reads a file from remote host
+
+        :param path: remote file path.
+        :param encoding: encoding used to decode file content. File content
+        is returned as bytes if None.
+        :raises IOError: when remote file can't be read.
+        """
+        with self.open_sftp() as sftp:
+            if sftp is None:
+                try:
+                    data = self.exec_command(
+                        "cat {}".format(shlex.quote(path)), encoding=None)
+                except exceptions.SSHExecCommandFailed as ex:
+                    raise IOError(ex.stderr)
+            else:
+                with sftp.open(path, 'rb') as remote_file:
+                    data = remote_file.read()
+        if encoding:
+            data = data.decode(encoding)
+        return data
+
+    def wait_for_file_content(self, path, expected, timeout=60, sleep=1,
+                              exception=None):
+        """Waits until remote file contains expected text
+
+        Only data appended to the file since previous check is read, so that
+        polling for big or rarely updated files is cheap. The end of data
+        read by previous check is read again to verify the file has not been
+        truncated or rewritten meanwhile, in which case it is read again from
+        the start.
+
+        :param path: remote file path. It is fine if it doesn't exist yet.
+        :param expected: text to look for.
+        :param timeout: time in seconds to wait.
+        :param sleep: polling interval in seconds.
+        :param exception: exception instance to raise on timeout. If None is
+        passed (default) then utils.WaitTimeout exception is raised.
+        """
+        with self.open_sftp() as sftp:
+            if sftp is None:
+                def file_contains_expected():
+                    try:
+                        return expected in self.get_file(path)
+                    except IOError:
+                        return False
+            else:
+                expected_data = expected.encode('utf-8')
+                state = {'offset': 0, 'tail': b''}
+
+                def file_contains_expected():
+                    tail = state['tail']
+                    try:
+                        with sftp.open(path, 'rb') as remote_file:
+                            start = state['offset'] - len(tail)
+                            remote_file.seek(start)
+                            data = remote_file.read()
+                            if not data.startswith(tail):
+                                # File has been truncated or rewritten: read
+                                # it again from the start
+                                start = 0
+                                remote_file.seek(start)
+                                data = remote_file.read()
+                    except IOError:
+                        return False
+                    state['offset'] = start + len(data)
+                    if expected_data in data:
+                        return True
+                    # Keep the end of data read in case expected text is
+                    # split between this and next read
+                    state['tail'] = data[-len(expected_data):]
+                    return False
+
+            utils.wait_until_true(file_contains_expected, timeout=timeout,
+                                  sleep=sleep, exception=exception)
+
+
+class _NetcatTunnel(object):
+    """paramiko.Channel executing netcat on a dedicated SSH connection
+
+    It behaves like the channel, and closing it also closes the connection.
+    """
+
+    def __init__(self, client, channel):
+        self._client = client
+        self._channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    def close(self):
+        try:
+            self._channel.close()
+        except (EOFError, socket.error, paramiko.SSHException):
+            # The connection is already broken
+            pass
+        finally:
+            self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, _value, _traceback):
+        self.close()
+
+
+def _check_command_result(cmd, exit_status, out_data, err_data, encoding):
+    if encoding:
+        out_data = out_data.decode(encoding)
+        err_data = err_data.decode(encoding)
+    if 0 != exit_status:
+        raise exceptions.SSHExecCommandFailed(
+            command=cmd, exit_status=exit_status,
+            stderr=err_data, stdout=out_data)
+    return out_data
+
+
+# Python 2 and 3 compatible agent executing commands received from STDIN.
+# Like SSH server does, it executes them with the login shell of the user.
+# Every request is made of a line with command length followed by the
+# command. Every reply is made of a line with exit status, STDOUT length and
+# STDERR length followed by STDOUT and STDERR data.
+REMOTE_AGENT_SCRIPT = """
+import os
+import subprocess
+import sys
+shell = os.environ.get("SHELL") or "/bin/sh"
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+stdout = getattr(sys.stdout, "buffer", sys.stdout)
+stdout.write(b"REMOTE-AGENT-READY\\n")
+stdout.flush()
+while True:
+    header = stdin.readline()
+    if not header:
+        break
+    command = stdin.read(int(header))
+    process = subprocess.Popen(
+        [shell, "-c", command], stdin=open("/dev/null"),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    stdout.write(("%d %d %d\\n" % (
+        process.returncode, len(out), len(err))).encode())
+    stdout.write(out)
+    stdout.write(err)
+    stdout.flush()
+"""
+
+REMOTE_AGENT_COMMAND = (
+    "for python in python3 python; do "
+    "command -v $python > /dev/null && exec $python -u -c '{script}'; "
+    "done; exit 127".format(script=REMOTE_AGENT_SCRIPT))
+
+
+class _RemoteAgent(object):
+    """Agent executing commands sent over a single long-lived SSH channel"""
+
+    ready_message = b'REMOTE-AGENT-READY'
+
+    def __init__(self, host):
+        self.host = host
+        self._channel = None
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def start(self, open_session, timeout):
+        """Starts the agent
+
+        :param open_session: callable returning a new paramiko.Channel
+        :param timeout: time in seconds to wait for the agent to be ready.
+        """
+        try:
+            self._channel = open_session()
+            self._channel.exec_command(REMOTE_AGENT_COMMAND)
+            ready = self._read_line(time.time() + timeout)
+        except (EOFError, socket.error, paramiko.SSHException,
+                exceptions.TimeoutException) as ex:
+            self.close()
+            raise exc.RemoteAgentError(host=self.host, reason=ex)
+        if ready.strip() != self.ready_message:
+            self.close()
+            raise exc.RemoteAgentError(
+                host=self.host,
+                reason="unable to start agent: {!r}".format(ready))
+        LOG.debug("Remote agent started on host %r", self.host)
+
+    def execute(self, cmd, timeout):
+        """Executes command on remote host
+
+        :returns: (exit_status, stdout, stderr) tuple
+        :raises tempest.lib.exceptions.TimeoutException: when command
+        doesn't terminate before timeout expires.
+        :raises RemoteAgentError: when agent is not usable anymore.
+        """
+        with self._lock:
+            end_of_time = time.time() + timeout
+            try:
+                request = cmd.encode('utf-8')
+                self._channel.sendall(
+                    '{:d}\n'.format(len(request)).encode() + request)
+                header = self._read_line(end_of_time).split()
+                exit_status, out_size, err_size = [int(f) for f in header]
+                out_data = self._read(out_size, end_of_time)
+                err_data = self._read(err_size, end_of_time)
+            except exceptions.TimeoutException:
+                self.close()
+                raise exceptions.TimeoutException(
+                    "Command: '{0}' executed on host '{1}'.".format(
+                        cmd, self.host))
+            except (EOFError, ValueError, socket.error,
+                    paramiko.SSHException) as ex:
+                self.close()
+                raise exc.RemoteAgentError(host=self.host, reason=ex)
+        return exit_status, out_data, err_data
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+
+    def _read_line(self, end_of_time):
+        while b'\n' not in self._buffer:
+            self._receive(end_of_time)
+        line, _, rest = bytes(self._buffer).partition(b'\n')
+        self._buffer = bytearray(rest)
+        return line
+
+    def _read(self, size, end_of_time):
+        while len(self._buffer) < size:
+            self._receive(end_of_time)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _receive(self, end_of_time):
+        remaining_time = end_of_time - time.time()
+        if remaining_time <= 0.:
+            raise exceptions.TimeoutException()
+        self._channel.settimeout(remaining_time)
+        try:
+            data = self._channel.recv(65536)
+        except socket.timeout:
+            raise exceptions.TimeoutException()
+        if not data:
+            raise EOFError("remote agent terminated")
+        self._buffer += data
+
+
+class HostResult(collections.namedtuple(
+        'HostResult', ['client', 'output', 'error'])):
+    """Result of a command executed on a host by run_on_hosts function"""
+
+    @property
+    def host(self):
+        return self.client.host
+
+    def check(self):
+        """Returns command output or raises the exception it failed with"""
+        if self.error is not None:
+            raise self.error
+        return self.output
+
+
+def run_on_hosts(clients, command, script=False, max_workers=None,
+                 timeout=None, **kwargs):
+    """Executes the same command on many hosts concurrently
+
+    :param clients: SSH clients connected to hosts where to execute command.
 
-        channel = self.open_session()
-        with channel:
+    :param command: command line to be executed with exec_command method,
+    script to be executed with execute_script method when script is True,
+    or callable receiving the SSH client as its only argument.
 
+    :param script: executes command with execute_script method.
+
+    :param max_workers: maximum number of commands executed at the same
+    time. By default commands are executed on all hosts at the same time.
+
+    :param timeout: time in seconds to wait for all commands to terminate.
+    Results of commands that are still running when it expires report a
+    tempest.lib.exceptions.TimeoutException error.
+
+    :param **kwargs: other parameters for exec_command or execute_script.
+
+    :returns: list of HostResult, in the same order as clients.
+    """
+    clients = list(clients)
+    if callable(command):
+        execute = command
+    elif script:
+        def execute(client):
+            return client.execute_script(command, **kwargs)
+    else:
+        def execute(client):
+            return client.exec_command(command, **kwargs)
+
+    return [HostResult(client=client, output=output, error=error)
+            for client, (output, error) in zip(
+                clients, utils.call_concurrently(
+                    execute, clients, max_workers=max_workers,
+                    timeout=timeout))]
+
+
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+
+class _ScriptExecution(object):
+    """Script passed via STDIN to a shell interpreter on a remote host
+
+    Output chunks received from the channel are accumulated in lists and
+    joined only once at the end of script execution.
+    """
+
+    def __init__(self, client, script, shell, timeout, combine_stderr=False):
+        self.client = client
+        self.script = script
+        self.shell = shell
+        self.timeout = timeout
+        self.combine_stderr = combine_stderr
+        self.encoding = None
+        self.exit_status = None
+        self._chunks = {STDOUT: [], STDERR: []}
+        self._channel = None
+
+    def __enter__(self):
+        channel = self._channel = self.client.open_session()
+        try:
             # Combine STOUT and STDERR to have to handle with only one stream
-            channel.set_combine_stderr(combine_stderr)
+            channel.set_combine_stderr(self.combine_stderr)
 
             # Update local environment
             lang, encoding = locale.getlocale()
             if not lang:
                 lang, encoding = locale.getdefaultlocale()
+            self.encoding = encoding
             _locale = '.'.join([lang, encoding])
             channel.update_environment({'LC_ALL': _locale,
                                         'LANG': _locale})
 
-            if become_root:
-                shell = 'sudo ' + shell
-            # Spawn a Bash
-            channel.exec_command(shell)
-
-            end_of_script = False
-            lines_iterator = iter(script.splitlines())
-            while (not channel.exit_status_ready() and
-                   time.time() < end_of_time):
-                # Drain incoming data buffers
-                while channel.recv_ready():
-                    output_data += channel.recv(self.buf_size)
-                while channel.recv_stderr_ready():
-                    error_data += channel.recv_stderr(self.buf_size)
-
-                if not end_of_script and channel.send_ready():
-                    try:
-                        line = next(lines_iterator)
-                    except StopIteration:
-                        # Finalize Bash script execution
-                        channel.shutdown_write()
-                        end_of_script = True
-                    else:
-                        # Send script to Bash STDIN line by line
-                        channel.send((line + '\n').encode(encoding))
-                        continue
-
-                time.sleep(.1)
-
-            # Get exit status and drain incoming data buffers
-            if channel.exit_status_ready():
-                exit_status = channel.recv_exit_status()
+            self._execute(channel)
+
+            # Register event pipe: it gets notified as soon as some data is
+            # received on STDOUT or remote side closes the channel
+            channel.fileno()
+        except Exception:
+            channel.close()
+            raise
+        self._start_time = time.time()
+        self._end_of_time = self._start_time + self.timeout
+        return self
+
+    def _execute(self, channel):
+        # Spawn a Bash
+        channel.exec_command(self.shell)
+
+        # Send the whole script to Bash STDIN at once, then finalize Bash
+        # script execution
+        script = self.script
+        if script and not script.endswith('\n'):
+            script += '\n'
+        channel.sendall(script.encode(self.encoding))
+        channel.shutdown_write()
+
+    def __exit__(self, _type, _value, _traceback):
+        self._channel.close()
+        TIMINGS.record(self.client.host, 'exec',
+                       time.time() - self._start_time)
+
+    @property
+    def stdout(self):
+        return self._get_output(STDOUT)
+
+    @property
+    def stderr(self):
+        return self._get_output(STDERR)
+
+    def _get_output(self, stream):
+        return _buffer_to_string(b''.join(self._chunks[stream]),
+                                 self.encoding)
+
+    def iter_output(self, end_of_time=None):
+        """Yields (stream, data) tuples as soon as data is received
+
+        It terminates when the remote shell exits or timeout expires.
+
+        :param end_of_time: time when to stop waiting for data, when it comes
+        before execution timeout expires.
+        """
+        if end_of_time is None or end_of_time > self._end_of_time:
+            end_of_time = self._end_of_time
+        channel = self._channel
+        buf_size = self.client.buf_size
+        while True:
+            # When exit status is received every output data has already
+            # been received too
+            exit_status_ready = channel.exit_status_ready()
+
+            # Drain incoming data buffers
             while channel.recv_ready():
-                output_data += channel.recv(self.buf_size)
+                data = channel.recv(buf_size)
+                self._chunks[STDOUT].append(data)
+                yield STDOUT, data
             while channel.recv_stderr_ready():
-                error_data += channel.recv_stderr(self.buf_size)
+                data = channel.recv_stderr(buf_size)
+                self._chunks[STDERR].append(data)
+                yield STDERR, data
+
+            if exit_status_ready:
+                self.exit_status = channel.recv_exit_status()
+                return
+
+            remaining_time = end_of_time - time.time()
+            if remaining_time <= 0.:
+                return
+            # STDERR doesn't notify the event pipe, so wake up from time
+            # to time to drain it
+            _wait_for_channel(channel, min(remaining_time, 1.))
+
+    def iter_lines(self, stdout=True, stderr=False):
+        """Yields (stream, line) tuples as soon as lines are received"""
+        splitters = {}
+        if stdout:
+            splitters[STDOUT] = _LineSplitter(self.encoding)
+        if stderr:
+            splitters[STDERR] = _LineSplitter(self.encoding)
+        for stream, data in self.iter_output():
+            splitter = splitters.get(stream)
+            if splitter:
+                for line in splitter.feed(data):
+                    yield stream, line
+        for stream, splitter in splitters.items():
+            for line in splitter.feed(b'', final=True):
+                yield stream, line
 
-        stdout = _buffer_to_string(output_data, encoding)
-        if exit_status == 0:
+    def check(self):
+        """Returns STDOUT or raises an exception if script failed"""
+        stdout = self.stdout
+        if self.exit_status == 0:
             return stdout
 
-        stderr = _buffer_to_string(error_data, encoding)
-        if exit_status is None:
+        stderr = self.stderr
+        if self.exit_status is None:
             raise exc.SSHScriptTimeoutExpired(
-                command=shell, host=self.host, script=script, stderr=stderr,
-                stdout=stdout, timeout=timeout)
+                command=self.shell, host=self.client.host,
+                script=self.script, stderr=stderr, stdout=stdout,
+                timeout=self.timeout)
         else:
             raise exc.SSHScriptFailed(
-                command=shell, host=self.host, script=script, stderr=stderr,
-                stdout=stdout, exit_status=exit_status)
+                command=self.shell, host=self.client.host,
+                script=self.script, stderr=stderr, stdout=stdout,
+                exit_status=self.exit_status)
 
-    def get_hostname(self):
-        """Retrieve the remote machine hostname"""
-        try:
-            return self.exec_command('hostname')
-        except exceptions.SSHExecCommandFailed:
-            return self.exec_command('cat /etc/hostname')
+
+class _CommandStream(_ScriptExecution):
+    """Command executed on a remote host whose output lines are streamed"""
+
+    def __init__(self, *args, **kwargs):
+        super(_CommandStream, self).__init__(*args, **kwargs)
+        self._splitter = None
+        self._lines = collections.deque()
+
+    def __enter__(self):
+        super(_CommandStream, self).__enter__()
+        # The stream lasts until leaving the context: only waiting for lines
+        # is limited in time
+        self._end_of_time = float('inf')
+        return self
+
+    def _execute(self, channel):
+        channel.get_pty()
+        channel.exec_command(self.shell)
+        self._splitter = _LineSplitter(self.encoding)
+
+    def __iter__(self):
+        """Yields output lines
+
+        It terminates when the command terminates, or when no line is
+        received for stream timeout seconds.
+        """
+        while True:
+            while self._lines:
+                yield self._lines.popleft()
+            if not self._receive_lines(time.time() + self.timeout):
+                return
+
+    def wait_for_line(self, predicate, timeout=None):
+        """Reads output lines until one of them matches given predicate
+
+        :param predicate: callable receiving a line and returning a true
+        value when it matches, or a string that matching line contains.
+
+        :param timeout: time in seconds to wait for a matching line. By
+        default it is the stream timeout.
+
+        :returns: matching line, or None when command terminates or timeout
+        expires before receiving it.
+        """
+        if isinstance(predicate, str):
+            text = predicate
+
+            def predicate(line):
+                return text in line
+
+        if timeout is None:
+            timeout = self.timeout
+        end_of_time = time.time() + timeout
+        while True:
+            while self._lines:
+                line = self._lines.popleft()
+                if predicate(line):
+                    return line
+            if not self._receive_lines(end_of_time):
+                LOG.debug("No line matching %r received from command %r on "
+                          "host %r", predicate, self.script, self.client.host)
+                return None
+
+    def interrupt(self):
+        """Interrupts the command like pressing Ctrl+C on a terminal
+
+        Remote command receives SIGINT signal. Remaining command output can
+        still be received.
+        """
+        self._channel.sendall(b'\x03')
+
+    def _receive_lines(self, end_of_time):
+        """Receives output lines until some line is received
+
+        :returns: False when command terminated or when end_of_time has come
+        before receiving any line.
+        """
+        if self.exit_status is not None:
+            return False
+        for stream, data in self.iter_output(end_of_time=end_of_time):
+            if stream == STDOUT:
+                self._lines.extend(self._splitter.feed(data))
+                if self._lines:
+                    return True
+        if self.exit_status is not None:
+            self._lines.extend(self._splitter.feed(b'', final=True))
+        return bool(self._lines)
+
+
+class _LineSplitter(object):
+    """Splits incrementally received data in text lines"""
+
+    def __init__(self, encoding):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._pending = ''
+
+    def feed(self, data, final=False):
+        """Returns lines completed by given data
+
+        Lines are returned without line terminator. When final is True the
+        last line is returned even if it has no line terminator.
+        """
+        text = self._pending + self._decoder.decode(data, final)
+        # A carriage return could be followed by a line feed in next data
+        end = len(text)
+        if not final and text.endswith('\r'):
+            end -= 1
+        text, self._pending = text[:end], text[end:]
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split('\n')
+        last_line = lines.pop()
+        if final:
+            if last_line:
+                lines.append(last_line)
+        else:
+            self._pending = last_line + self._pending
+        return lines
+
+
+def _wait_for_channel(channel, timeout):
+    """Waits until channel has data to read or it is closed
+
+    :param channel: paramiko.Channel which event pipe has been registered by
+    calling its fileno() method.
+
+    :param timeout: maximum time to wait in seconds.
+    """
+    if Client._can_system_poll():
+        poll = select.poll()
+        poll.register(channel, select.POLLIN)
+        poll.poll(timeout * 1000.)
+    else:
+        select.select([channel], [], [], timeout)
 
 
 def _buffer_to_string(data_buffer, encoding):
@@ -18,6 +18,8 @@
 
 """Utilities and helper functions."""
 
+from concurrent import futures
+import contextlib
 import threading
 import time
 try:
@@ -85,6 +87,43 @@ def wait_until_true(predicate, timeout=60, sleep=1, exception=None):
         raise WaitTimeout("Timed out after %d seconds" % timeout)
 
 
+def call_concurrently(func, items, max_workers=None, timeout=None):
+    """Calls func for every item concurrently using a pool of threads
+
+    :param func: callable receiving an item as its only argument.
+    :param items: items to be passed to func.
+    :param max_workers: maximum number of concurrent calls. By default func
+    is called for all items at the same time.
+    :param timeout: time in seconds to wait for all calls to terminate.
+    :returns: list of (result, exception) tuples, in the same order as
+    items. Calls that are still running when timeout expires report a
+    TimeoutException.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    executor = futures.ThreadPoolExecutor(
+        max_workers=max_workers or len(items))
+    try:
+        pending = [executor.submit(func, item) for item in items]
+        futures.wait(pending, timeout=timeout)
+    finally:
+        # Don't wait for calls that are still running after timeout
+        executor.shutdown(wait=False)
+
+    results = []
+    for future in pending:
+        if future.done():
+            error = future.exception()
+            results.append((None if error else future.result(), error))
+        else:
+            future.cancel()
+            results.append((None, exceptions.TimeoutException(
+                "Call didn't terminate in {!s} seconds.".format(timeout))))
+    return results
+
+
 def override_class(overriden_class, overrider_class):
     """Override class definition with a MixIn class
 
@@ -152,6 +191,9 @@ class StatefulConnection:
         self.port = target_port
         self.connection_started = False
         self.test_attempt = 0
+        self._streams = contextlib.ExitStack()
+        self._server_stream = None
+        self._client_stream = None
 
     def __enter__(self):
         return self
@@ -161,14 +203,18 @@ class StatefulConnection:
         return 'attempt_{}'.format(str(self.test_attempt).zfill(3))
 
     def _start_connection(self):
+        # Terminate netcat processes started by previous attempts, if any
+        self._streams.close()
         self.server_ssh.exec_command(
                 'echo "{}" > input.txt'.format(self.test_str))
-        self.server_ssh.exec_command('tail -f input.txt | nc -lp '
-                '{} &> output.txt &'.format(self.port))
+        self._server_stream = self._streams.enter_context(
+            self.server_ssh.stream_command(
+                'tail -f input.txt | nc -lp {}'.format(self.port)))
         self.client_ssh.exec_command(
                 'echo "{}" > input.txt'.format(self.test_str))
-        self.client_ssh.exec_command('tail -f input.txt | nc {} {} &>'
-                'output.txt &'.format(self.ip, self.port))
+        self._client_stream = self._streams.enter_context(
+            self.client_ssh.stream_command(
+                'tail -f input.txt | nc {} {}'.format(self.ip, self.port)))
 
     def _test_connection(self):
         if not self.connection_started:
@@ -177,35 +223,29 @@ class StatefulConnection:
             self.server_ssh.exec_command(
                     'echo "{}" >> input.txt'.format(self.test_str))
             self.client_ssh.exec_command(
-                    'echo "{}" >> input.txt & sleep 1'.format(self.test_str))
+                    'echo "{}" >> input.txt'.format(self.test_str))
         try:
-            self.server_ssh.exec_command(
-                    'grep {} output.txt'.format(self.test_str))
-            self.client_ssh.exec_command(
-                    'grep {} output.txt'.format(self.test_str))
+            # Lines sent by each host are received from netcat on the other
+            # one as soon as they arrive
+            received = all(
+                stream.wait_for_line(self.test_str,
+                                     timeout=self.line_timeout) is not None
+                for stream in [self._server_stream, self._client_stream])
             if not self.should_pass:
-                return False
+                return not received
             else:
-                if not self.connection_started:
+                if received and not self.connection_started:
                     self.connection_started = True
-                return True
-        except exceptions.SSHExecCommandFailed:
-            if self.should_pass:
-                return False
-            else:
-                return True
+                return received
         finally:
             self.test_attempt += 1
 
     def test_connection(self, should_pass=True, timeout=10, sleep_timer=1):
         self.should_pass = should_pass
+        self.line_timeout = sleep_timer
         wait_until_true(
                 self._test_connection, timeout=timeout, sleep=sleep_timer)
 
     def __exit__(self, type, value, traceback):
-        self.server_ssh.exec_command('sudo killall nc || killall nc')
-        self.server_ssh.exec_command(
-                'sudo killall tail || killall tail || echo "True"')
-        self.client_ssh.exec_command('sudo killall nc || killall nc')
-        self.client_ssh.exec_command(
-                'sudo killall tail || killall tail || echo "True"')
+        # Closing the streams terminates netcat processes on both hosts
+        self._streams.close()
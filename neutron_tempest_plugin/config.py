@@ -97,6 +97,119 @@ NeutronPluginOptions = [
     cfg.IntOpt('ssh_proxy_jump_port',
                default=22,
                help='Port used to connect to "ssh_proxy_jump_host".'),
+
+    # Options for SSH connections reuse
+    cfg.BoolOpt('ssh_connection_pool',
+                default=False,
+                help='Keep authenticated SSH connections to VMs alive and '
+                     'share them between SSH clients connecting to the same '
+                     'host, port and user with the same credentials. Every '
+                     'executed command opens a new channel on the pooled '
+                     'connection instead of creating a new connection. As '
+                     'a pooled connection keeps reaching the same VM, tests '
+                     'moving a floating IP to another VM may reach the '
+                     'previous one. The connection to the SSH proxy jump '
+                     'host is always shared.'),
+    cfg.IntOpt('ssh_connection_pool_idle_timeout',
+               default=60,
+               help='Time in seconds an unused pooled SSH connection is kept '
+                    'alive before being closed.'),
+    cfg.BoolOpt('ssh_remote_agent',
+                default=False,
+                help='Execute commands on VMs by sending them to a small '
+                     'Python agent started once on every VM and receiving '
+                     'commands over a single SSH channel, instead of opening '
+                     'a new SSH channel for every command. On VMs where '
+                     'Python is not available commands are executed as '
+                     'usual.'),
+    cfg.BoolOpt('ssh_readiness_probe',
+                default=True,
+                help='Before trying to establish an SSH connection to a VM, '
+                     'wait until its SSH server accepts TCP connections and '
+                     'sends its protocol banner.'),
+    cfg.BoolOpt('ssh_timings',
+                default=False,
+                help='Record time spent by SSH clients per remote host '
+                     'connecting, exchanging keys, authenticating, opening '
+                     'channels and executing commands. Scenario tests attach '
+                     'a JSON summary of them to their results as '
+                     '"ssh-timings" detail.'),
+
+    # Options for HTTP connections reuse
+    cfg.BoolOpt('http_keep_alive',
+                default=False,
+                help='Keep HTTP connections to API endpoints alive and share '
+                     'them between all REST clients created by the same test '
+                     'process, instead of opening a new connection for every '
+                     'request.'),
+    cfg.IntOpt('http_connection_pool_size',
+               default=10,
+               help='Maximum number of idle HTTP connections kept alive to '
+                    'every API endpoint when "http_keep_alive" is enabled.'),
+
+    # Options for network client resource waiters
+    cfg.BoolOpt('wait_changed_since',
+                default=False,
+                help='When waiting for resources to get a given state, after '
+                     'the first polling round only list resources changed '
+                     'since the previous one by using the "changed_since" '
+                     'filter. It requires the "standard-attr-timestamp" '
+                     'extension.'),
+
+    # Options for network client caches
+    cfg.FloatOpt('show_cache_ttl',
+                 default=0,
+                 min=0,
+                 help='Time in seconds network clients serve repeated show '
+                      'requests of the same resource from a cache. The '
+                      'cache of a client is invalidated by any create, '
+                      'update or delete request sent by the same client. '
+                      'Zero disables the cache.'),
+    cfg.BoolOpt('coalesce_get_requests',
+                default=True,
+                help='When a network client is requested to GET the same '
+                     'URL by more threads at the same time, send only one '
+                     'request and share its response between all of them.'),
+
+    # Options for test resources cleanup
+    cfg.IntOpt('resource_cleanup_workers',
+               default=8,
+               min=1,
+               help='Maximum number of resources deleted concurrently when '
+                    'cleaning up resources created by API test classes. '
+                    'Resources depending on each other are always deleted '
+                    'one after the other.'),
+
+    # Options for subnet CIDRs allocation
+    cfg.BoolOpt('share_subnet_cidrs',
+                default=True,
+                help='Allocate CIDRs of subnets created from the configured '
+                     'project networks CIDRs so that they are not used by '
+                     'any other test class, also when running in other '
+                     'worker processes. Allocations are stored in the '
+                     'oslo_concurrency lock_path directory.'),
+
+    cfg.IntOpt('external_subnet_cidrs_cache_time',
+               default=0,
+               min=0,
+               help='Time in seconds CIDRs of external subnets listed by a '
+                    'test class are stored in the oslo_concurrency '
+                    'lock_path directory, to be used by test classes running '
+                    'in other worker processes instead of listing them '
+                    'again. When 0 they are only shared by test classes '
+                    'running in the same process.'),
+
+    # Options for network topologies pool
+    cfg.IntOpt('topology_pool_size',
+               default=0,
+               min=0,
+               help='Number of network topologies (network, subnet, router, '
+                    'security group and keypair) created at once and kept '
+                    'ready by every worker process for test classes using '
+                    'the same credentials and requirements. Topologies are '
+                    'reused only with pre-provisioned credentials. When 0 '
+                    'every test class creates and deletes its own.'),
+
     cfg.IntOpt('reboots_in_test',
                default=1,
                help='Number of reboots to apply if tests requires reboots'),
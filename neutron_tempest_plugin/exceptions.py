@@ -47,10 +47,19 @@ class InvalidServiceTag(NeutronTempestPluginException):
     message = "Invalid service tag"
 
 
+class NoFreeCIDR(NeutronTempestPluginException):
+    message = "No free CIDR with prefix length %(prefixlen)d in %(cidr)s"
+
+
 class SSHScriptException(exceptions.TempestException):
     """Base class for SSH client execute_script() exceptions"""
 
 
+class RemoteAgentError(NeutronTempestPluginException):
+    """Raised when remote command agent can't be used on a host"""
+    message = "Remote command agent error on host %(host)r: %(reason)s"
+
+
 class ShellError(NeutronTempestPluginException):
     pass
 
@@ -21,12 +21,14 @@ import netaddr
 from neutron_lib.api import validators
 from neutron_lib import constants as neutron_lib_constants
 from oslo_log import log
+from oslo_serialization import jsonutils
 from paramiko import ssh_exception as ssh_exc
 from tempest.common.utils import net_utils
 from tempest.common import waiters
 from tempest.lib.common.utils import data_utils
 from tempest.lib.common.utils import test_utils
 from tempest.lib import exceptions as lib_exc
+from testtools import content
 
 from neutron_tempest_plugin.api import base as base_api
 from neutron_tempest_plugin.common import ip as ip_utils
@@ -85,6 +87,23 @@ def get_ncat_client_cmd(ip_address, port, protocol):
 
 class BaseTempestTestCase(base_api.BaseNetworkTest):
 
+    def setUp(self):
+        super(BaseTempestTestCase, self).setUp()
+        if ssh.TIMINGS.enabled:
+            self.addCleanup(self._attach_ssh_timings)
+
+    def _attach_ssh_timings(self):
+        """Attaches SSH timings recorded while running the test to it
+
+        Timings recorded during class resource setup are accounted to the
+        first test of the class.
+        """
+        timings = ssh.TIMINGS.pop_summary()
+        if timings:
+            LOG.debug("SSH timings of test %s: %s", self.id(),
+                      jsonutils.dumps(timings, sort_keys=True))
+            self.addDetail('ssh-timings', content.json_content(timings))
+
     def create_server(self, flavor_ref, image_ref, key_name, networks,
                       **kwargs):
         """Create a server using tempest lib
@@ -153,19 +172,15 @@ class BaseTempestTestCase(base_api.BaseNetworkTest):
                               client=None):
         client = client or cls.os_primary.network_client
         if not secgroup_id:
-            sgs = client.list_security_groups()['security_groups']
-            for sg in sgs:
+            for sg in client.iter_security_groups():
                 if sg['name'] == constants.DEFAULT_SECURITY_GROUP:
                     secgroup_id = sg['id']
                     break
-        resp = []
-        for rule in rule_list:
-            direction = rule.pop('direction')
-            resp.append(client.create_security_group_rule(
-                        direction=direction,
-                        security_group_id=secgroup_id,
-                        **rule)['security_group_rule'])
-        return resp
+        if not rule_list:
+            return []
+        return client.create_bulk_security_group_rule(
+            [dict(rule, security_group_id=secgroup_id)
+             for rule in rule_list])['security_group_rules']
 
     @classmethod
     def create_loginable_secgroup_rule(cls, secgroup_id=None,
@@ -265,31 +280,39 @@ class BaseTempestTestCase(base_api.BaseNetworkTest):
         """Create network resources and a server.
 
         Creating a network, subnet, router, keypair, security group
-        and a server.
+        and a server. When neither network nor router are given, network
+        resources are leased (see lease_topology method).
         """
-        self.network = network or self.create_network()
-        LOG.debug("Created network %s", self.network['name'])
-        self.subnet = self.create_subnet(self.network)
-        LOG.debug("Created subnet %s", self.subnet['id'])
-
-        secgroup = self.os_primary.network_client.create_security_group(
-            name=data_utils.rand_name('secgroup'))
-        LOG.debug("Created security group %s",
-                  secgroup['security_group']['name'])
-        self.security_groups.append(secgroup['security_group'])
-        if not router:
-            router = self.create_router_by_client(**kwargs)
-        self.create_router_interface(router['id'], self.subnet['id'])
-        self.keypair = self.create_keypair()
+        if network is None and router is None and not kwargs:
+            (self.network, self.subnet, router, self.security_group,
+             self.keypair) = self.lease_topology()
+            LOG.debug("Leased network %s", self.network['name'])
+            self._wait_for_router_ha_active(router['id'])
+        else:
+            self.network = network or self.create_network()
+            LOG.debug("Created network %s", self.network['name'])
+            self.subnet = self.create_subnet(self.network)
+            LOG.debug("Created subnet %s", self.subnet['id'])
+
+            self.security_group = (
+                self.os_primary.network_client.create_security_group(
+                    name=data_utils.rand_name('secgroup'))['security_group'])
+            LOG.debug("Created security group %s",
+                      self.security_group['name'])
+            self.security_groups.append(self.security_group)
+            if not router:
+                router = self.create_router_by_client(**kwargs)
+            self.create_router_interface(router['id'], self.subnet['id'])
+            self.keypair = self.create_keypair()
         self.create_loginable_secgroup_rule(
-            secgroup_id=secgroup['security_group']['id'])
+            secgroup_id=self.security_group['id'])
 
         server_kwargs = {
             'flavor_ref': CONF.compute.flavor_ref,
             'image_ref': CONF.compute.image_ref,
             'key_name': self.keypair['name'],
             'networks': [{'uuid': self.network['id']}],
-            'security_groups': [{'name': secgroup['security_group']['name']}],
+            'security_groups': [{'name': self.security_group['name']}],
         }
         if server_name is not None:
             server_kwargs['name'] = server_name
@@ -549,6 +572,7 @@ class BaseTempestTestCase(base_api.BaseNetworkTest):
                                 external_port=None):
         """Compare hostnames of given servers with their names."""
         try:
+            ssh_clients = []
             for server in servers:
                 kwargs = {}
                 if timeout:
@@ -558,13 +582,15 @@ class BaseTempestTestCase(base_api.BaseNetworkTest):
                         server['port_forwarding_tcp']['external_port'])
                 except KeyError:
                     pass
-                ssh_client = ssh.Client(
+                ssh_clients.append(ssh.Client(
                     self.fip['floating_ip_address'],
                     CONF.validation.image_ssh_user,
                     pkey=self.keypair['private_key'],
-                    **kwargs)
-                self.assertIn(server['name'],
-                              ssh_client.get_hostname())
+                    **kwargs))
+            # Get all hostnames at the same time
+            results = ssh.run_on_hosts(ssh_clients, ssh.Client.get_hostname)
+            for server, result in zip(servers, results):
+                self.assertIn(server['name'], result.check())
         except (lib_exc.SSHTimeout, ssh_exc.AuthenticationException) as ssh_e:
             LOG.debug(ssh_e)
             if log_errors:
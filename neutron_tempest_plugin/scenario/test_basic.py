@@ -50,3 +50,26 @@ class NetworkBasicTest(base.BaseTempestTestCase):
             server_ssh_client,
             CONF.neutron_plugin_options.global_ip_address,
             ping_count=1)
+
+    @decorators.idempotent_id('f94a7bc4-cad7-44da-8bae-532ab1d324d9')
+    def test_leased_topology(self):
+        topology = self.lease_topology()
+        router = self.os_admin.network_client.show_router(
+            topology.router['id'])['router']
+        self.assertEqual(CONF.network.public_network_id,
+                         router['external_gateway_info']['network_id'])
+        router_ports = self.os_admin.network_client.list_ports(
+            device_id=router['id'],
+            network_id=topology.network['id'])['ports']
+        self.assertEqual(
+            [topology.subnet['id']],
+            [fixed_ip['subnet_id'] for port in router_ports
+             for fixed_ip in port['fixed_ips']])
+        self.assertEqual(
+            topology.security_group['id'],
+            self.client.show_security_group(
+                topology.security_group['id'])['security_group']['id'])
+        self.assertEqual(
+            topology.keypair['name'],
+            self.os_primary.keypairs_client.show_keypair(
+                topology.keypair['name'])['keypair']['name'])
@@ -278,28 +278,13 @@ class FloatingIPPortDetailsTest(FloatingIpTestCasesMixin,
         """Waits for the port's device_id to be unset.
 
         :param port_id: The id of the port being detached.
-        :returns: The final port dict from the show_port response.
+        :returns: The final port dict as last listed.
         """
-        port = self.client.show_port(port_id)['port']
-        device_id = port['device_id']
-        start = int(time.time())
-
         # NOTE(mriedem): Nova updates the port's device_id to '' rather than
         # None, but it's not contractual so handle Falsey either way.
-        while device_id:
-            time.sleep(interval)
-            port = self.client.show_port(port_id)['port']
-            device_id = port['device_id']
-
-            timed_out = int(time.time()) - start >= timeout
-
-            if device_id and timed_out:
-                message = ('Port %s failed to detach (device_id %s) within '
-                           'the required time (%s s).' %
-                           (port_id, device_id, timeout))
-                raise exceptions.TimeoutException(message)
-
-        return port
+        return self.client.wait_for_resources(
+            'port', [port_id], lambda port: port and not port['device_id'],
+            'detached', timeout=timeout, max_interval=interval)[port_id]
 
     def _wait_for_fip_port_down(self, fip_id, timeout=120, interval=10):
         """Waits for the fip's attached port status to be 'DOWN'.
@@ -20,7 +20,6 @@ from tempest.lib import decorators
 from tempest.lib import exceptions as lib_exc
 
 from neutron_tempest_plugin.common import ssh
-from neutron_tempest_plugin.common import utils
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin import exceptions
 from neutron_tempest_plugin.scenario import base
@@ -135,8 +134,7 @@ class MacLearningTest(base.BaseTempestTestCase):
                                          self.completed_message)
         self._check_cmd_installed_on_server(server['ssh_client'], server,
                                             'tcpdump')
-        server['ssh_client'].execute_script(
-            'echo "%s" > %s' % (check_script, self.sender_script_file))
+        server['ssh_client'].put_file(self.sender_script_file, check_script)
 
     def _prepare_listener(self, server, n_packets):
         check_script = get_receiver_script(
@@ -144,8 +142,7 @@ class MacLearningTest(base.BaseTempestTestCase):
             packets_expected=n_packets)
         self._check_cmd_installed_on_server(server['ssh_client'], server,
                                             'tcpdump')
-        server['ssh_client'].execute_script(
-            'echo "%s" > %s' % (check_script, self.receiver_script_file))
+        server['ssh_client'].put_file(self.receiver_script_file, check_script)
 
     @decorators.idempotent_id('013686ac-23b1-23e4-8361-10b1c98a2861')
     def test_mac_learning_vms_on_same_network(self):
@@ -160,9 +157,10 @@ class MacLearningTest(base.BaseTempestTestCase):
         non_receiver = self._create_server()
 
         def check_server_result(server, expected_result, output_file):
-            result = server['ssh_client'].execute_script(
-                "cat {path} || echo '{path} not exists yet'".format(
-                    path=output_file))
+            try:
+                result = server['ssh_client'].get_file(output_file)
+            except IOError:
+                result = '{path} not exists yet'.format(path=output_file)
             LOG.debug("VM result: %s", result)
             return expected_result in result
 
@@ -187,18 +185,15 @@ class MacLearningTest(base.BaseTempestTestCase):
                 "bash %s" % self.sender_script_file, become_root=True)
 
         # Check if the message was sent.
-        utils.wait_until_true(
-            lambda: check_server_result(
-                sender, self.completed_message,
-                self.sender_output_file),
+        sender['ssh_client'].wait_for_file_content(
+            self.sender_output_file, self.completed_message,
             exception=RuntimeError(
                 "Sender script wasn't executed properly"))
 
         # Check receiver server
         receiver_expected_result = '5 packets captured'
-        utils.wait_until_true(
-            lambda: check_server_result(receiver,
-                receiver_expected_result, self.output_file),
+        receiver['ssh_client'].wait_for_file_content(
+            self.output_file, receiver_expected_result,
             exception=RuntimeError(
                 'Receiver server did not receive expected packet'))
 
@@ -46,80 +46,76 @@ class NetworkMigrationTestBase(base.BaseTempestTestCase,
         self.assertEqual(is_dvr, router['router']['distributed'])
         self.assertEqual(is_ha, router['router']['ha'])
 
-    def _wait_until_port_deleted(self, router_id, device_owner):
+    def _wait_until_ports_deleted(self, router_id, device_owners):
         common_utils.wait_until_true(
             functools.partial(
-                self._is_port_deleted,
+                self._are_ports_deleted,
                 router_id,
-                device_owner),
+                device_owners),
             timeout=300, sleep=5)
 
-    def _is_port_deleted(self, router_id, device_owner):
+    def _are_ports_deleted(self, router_id, device_owners):
         ports = self.os_admin.network_client.list_ports(
             device_id=router_id,
-            device_owner=device_owner)
+            device_owner=device_owners,
+            fields=['id'])
         return not ports.get('ports')
 
-    def _wait_until_port_ready(self, router_id, device_owner):
+    def _wait_until_ports_ready(self, router_id, device_owners):
         common_utils.wait_until_true(
             functools.partial(
-                self._is_port_active,
+                self._are_ports_active,
                 router_id,
-                device_owner),
+                device_owners),
             timeout=300, sleep=5)
 
     def _wait_until_router_ports_down(self, router_id):
-
-        def _is_port_down(port_id):
-            port = self.os_admin.network_client.show_port(port_id).get('port')
-            return port['status'] == const.DOWN
-
-        ports = self.os_admin.network_client.list_ports(
-            device_id=router_id).get('ports')
-        for port in ports:
-            common_utils.wait_until_true(
-                functools.partial(_is_port_down, port['id']),
-                timeout=300, sleep=5)
-
-    def _is_port_active(self, router_id, device_owner):
+        client = self.os_admin.network_client
+        ports = client.list_ports(device_id=router_id,
+                                  fields=['id']).get('ports')
+        client.wait_for_resources_status(
+            'port', [port['id'] for port in ports], const.DOWN,
+            timeout=300, max_interval=5)
+
+    def _are_ports_active(self, router_id, device_owners):
         ports = self.os_admin.network_client.list_ports(
             device_id=router_id,
-            device_owner=device_owner,
-            status=const.ACTIVE).get('ports')
-        if ports:
-            if ports[0][pb.VIF_TYPE] not in [pb.VIF_TYPE_UNBOUND,
-                                             pb.VIF_TYPE_BINDING_FAILED]:
-                return True
-        return False
+            device_owner=device_owners,
+            status=const.ACTIVE,
+            fields=['device_owner', pb.VIF_TYPE]).get('ports')
+        # Only the first port listed for every device owner is checked
+        first_ports = {}
+        for port in ports:
+            first_ports.setdefault(port['device_owner'], port)
+        return all(
+            owner in first_ports and
+            first_ports[owner][pb.VIF_TYPE] not in [
+                pb.VIF_TYPE_UNBOUND, pb.VIF_TYPE_BINDING_FAILED]
+            for owner in device_owners)
 
     def _wait_until_router_ports_ready(self, router_id, dvr, ha):
+        device_owners = [const.DEVICE_OWNER_ROUTER_GW]
         if dvr:
-            self._wait_until_port_ready(
-                router_id, const.DEVICE_OWNER_DVR_INTERFACE)
+            device_owners.append(const.DEVICE_OWNER_DVR_INTERFACE)
         if ha:
-            self._wait_until_port_ready(
-                router_id, const.DEVICE_OWNER_ROUTER_HA_INTF)
+            device_owners.append(const.DEVICE_OWNER_ROUTER_HA_INTF)
             if dvr:
-                self._wait_until_port_ready(
-                    router_id, const.DEVICE_OWNER_ROUTER_SNAT)
+                device_owners.append(const.DEVICE_OWNER_ROUTER_SNAT)
             else:
-                self._wait_until_port_ready(
-                    router_id, const.DEVICE_OWNER_HA_REPLICATED_INT)
-        self._wait_until_port_ready(
-            router_id, const.DEVICE_OWNER_ROUTER_GW)
+                device_owners.append(const.DEVICE_OWNER_HA_REPLICATED_INT)
+        self._wait_until_ports_ready(router_id, device_owners)
 
     def _wait_until_router_ports_migrated(
             self, router_id, before_dvr, before_ha, after_dvr, after_ha):
+        device_owners = []
         if before_ha and not after_ha:
-            self._wait_until_port_deleted(
-                router_id, const.DEVICE_OWNER_ROUTER_HA_INTF)
-            self._wait_until_port_deleted(
-                    router_id, const.DEVICE_OWNER_HA_REPLICATED_INT)
+            device_owners += [const.DEVICE_OWNER_ROUTER_HA_INTF,
+                              const.DEVICE_OWNER_HA_REPLICATED_INT]
         if before_dvr and not after_dvr:
-            self._wait_until_port_deleted(
-                router_id, const.DEVICE_OWNER_DVR_INTERFACE)
-            self._wait_until_port_deleted(
-                router_id, const.DEVICE_OWNER_ROUTER_SNAT)
+            device_owners += [const.DEVICE_OWNER_DVR_INTERFACE,
+                              const.DEVICE_OWNER_ROUTER_SNAT]
+        if device_owners:
+            self._wait_until_ports_deleted(router_id, device_owners)
         self._wait_until_router_ports_ready(router_id, after_dvr, after_ha)
 
     def _test_migration(self, before_dvr, before_ha, after_dvr, after_ha):
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import re
+
 import netaddr
 from neutron_lib import constants
 from oslo_log import log
@@ -23,7 +25,6 @@ from tempest.lib import exceptions as lib_exc
 
 from neutron_tempest_plugin.common import ip
 from neutron_tempest_plugin.common import ssh
-from neutron_tempest_plugin.common import utils
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin import exceptions
 from neutron_tempest_plugin.scenario import base
@@ -113,13 +114,9 @@ with open('%(result_file)s', 'w') as f:
            'result_file': result_file}
 
 
-def get_unregistered_script(interface, group, result_file):
-    return """#!/bin/bash
-export LC_ALL=en_US.UTF-8
-tcpdump -i %(interface)s host %(group)s -vvneA -s0 -l -c1 &> %(result_file)s &
-    """ % {'interface': interface,
-           'group': group,
-           'result_file': result_file}
+def get_unregistered_command(interface, group):
+    return ("tcpdump -i %(interface)s host %(group)s -vvneA -s0 -l -c1" %
+            {'interface': interface, 'group': group})
 
 
 class BaseMulticastTest(object):
@@ -136,7 +133,6 @@ class BaseMulticastTest(object):
     multicast_message = "Big Bang"
     receiver_output_file = "/tmp/receiver_mcast_out"
     sender_output_file = "/tmp/sender_mcast_out"
-    unregistered_output_file = "/tmp/unregistered_mcast_out"
 
     @classmethod
     def skip_checks(cls):
@@ -232,8 +228,8 @@ class BaseMulticastTest(object):
             group=mcast_address, port=self.multicast_port,
             message=self.multicast_message,
             result_file=self.sender_output_file)
-        server['ssh_client'].execute_script(
-            'echo "%s" > /tmp/multicast_traffic_sender.py' % check_script)
+        server['ssh_client'].put_file('/tmp/multicast_traffic_sender.py',
+                                      check_script)
 
     def _prepare_receiver(self, server, mcast_address):
         check_script = get_receiver_script(
@@ -246,8 +242,8 @@ class BaseMulticastTest(object):
             pkey=self.keypair['private_key'])
         self._check_cmd_installed_on_server(ssh_client, server,
                                             PYTHON3_BIN)
-        server['ssh_client'].execute_script(
-            'echo "%s" > /tmp/multicast_traffic_receiver.py' % check_script)
+        server['ssh_client'].put_file('/tmp/multicast_traffic_receiver.py',
+                                      check_script)
 
     def _prepare_unregistered(self, server, mcast_address):
         ssh_client = ssh.Client(
@@ -257,13 +253,10 @@ class BaseMulticastTest(object):
         ip_command = ip.IPCommand(ssh_client=ssh_client)
         addresses = ip_command.list_addresses(port=server['port'])
         port_iface = ip.get_port_device_name(addresses, server['port'])
-        check_script = get_unregistered_script(
-            interface=port_iface, group=mcast_address,
-            result_file=self.unregistered_output_file)
         self._check_cmd_installed_on_server(ssh_client, server,
                                             'tcpdump')
-        server['ssh_client'].execute_script(
-            'echo "%s" > /tmp/unregistered_traffic_receiver.sh' % check_script)
+        return get_unregistered_command(interface=port_iface,
+                                        group=mcast_address)
 
     @decorators.idempotent_id('113486fc-24c9-4be4-8361-03b1c9892867')
     def test_multicast_between_vms_on_same_network(self):
@@ -304,29 +297,55 @@ class BaseMulticastTest(object):
         mcast_address = next(self.multicast_group_iter)
         LOG.debug("Multicast group address: %s", mcast_address)
 
-        def _message_received(client, msg, file_path):
-            result = client.execute_script(
-                "cat {path} || echo '{path} not exists yet'".format(
-                    path=file_path))
-            return msg in result
+        unregistered_command = self._prepare_unregistered(unregistered,
+                                                          mcast_address)
 
-        self._prepare_unregistered(unregistered, mcast_address)
-
-        # Run the unregistered node script
-        unregistered['ssh_client'].execute_script(
-            "bash /tmp/unregistered_traffic_receiver.sh", become_root=True)
+        # Run tcpdump on the unregistered node
+        with unregistered['ssh_client'].stream_command(
+                unregistered_command, become_root=True) as tcpdump:
+            self.assertIsNotNone(
+                tcpdump.wait_for_line('listening on', timeout=60),
+                "tcpdump didn't start on unregistered server.")
+            self._check_multicast_traffic(sender=sender, receivers=receivers,
+                                          mcast_address=mcast_address)
 
+            expected_result = '1 packet captured'
+            unregistered_error_message = (
+                'Unregistered server did not received expected packet.')
+            if not self._is_multicast_traffic_expected(mcast_address):
+                # tcpdump runs on the unregistered node with "-c" option so
+                # it will be stopped automatically if it will receive packet
+                # matching filters. We don't expect any packets to be
+                # captured really in this case so let's interrupt tcpdump so
+                # it writes its statistics.
+                expected_result = '0 packets captured'
+                unregistered_error_message = (
+                    'Unregistered server received unexpected packet(s).')
+                tcpdump.interrupt()
+
+            unregistered_result = tcpdump.wait_for_line(
+                lambda line: re.search(r'\d+ packets? captured', line),
+                timeout=60)
+        LOG.debug("Unregistered VM result: %s", unregistered_result)
+        self.assertIn(expected_result, unregistered_result or '',
+                      unregistered_error_message)
+
+    def _check_multicast_traffic(self, sender, receivers, mcast_address):
         self._prepare_sender(sender, mcast_address)
-        receiver_ids = []
         for receiver in receivers:
             self._prepare_receiver(receiver, mcast_address)
-            receiver['ssh_client'].execute_script(
+
+        # Start receiver scripts on all receivers at the same time
+        for result in ssh.run_on_hosts(
+                [receiver['ssh_client'] for receiver in receivers],
                 "%s /tmp/multicast_traffic_receiver.py &" % PYTHON3_BIN,
-                shell="bash")
-            utils.wait_until_true(
-                lambda: _message_received(
-                    receiver['ssh_client'], self.hello_message,
-                    self.receiver_output_file),
+                script=True, shell="bash"):
+            result.check()
+
+        receiver_ids = []
+        for receiver in receivers:
+            receiver['ssh_client'].wait_for_file_content(
+                self.receiver_output_file, self.hello_message,
                 exception=RuntimeError(
                     "Receiver script didn't start properly on server "
                     "{!r}.".format(receiver['id'])))
@@ -339,55 +358,22 @@ class BaseMulticastTest(object):
 
         # And check if message was received
         for receiver in receivers:
-            utils.wait_until_true(
-                lambda: _message_received(
-                    receiver['ssh_client'], self.multicast_message,
-                    self.receiver_output_file),
+            receiver['ssh_client'].wait_for_file_content(
+                self.receiver_output_file, self.multicast_message,
                 exception=RuntimeError(
                     "Receiver {!r} didn't get multicast message".format(
                         receiver['id'])))
 
         # TODO(slaweq): add validation of answears on sended server
-        replies_result = sender['ssh_client'].execute_script(
-            "cat {path} || echo '{path} not exists yet'".format(
-                path=self.sender_output_file))
+        try:
+            replies_result = sender['ssh_client'].get_file(
+                self.sender_output_file)
+        except IOError:
+            replies_result = '{path} not exists yet'.format(
+                path=self.sender_output_file)
         for receiver_id in receiver_ids:
             self.assertIn(receiver_id, replies_result)
 
-        def check_unregistered_host():
-            unregistered_result = unregistered['ssh_client'].execute_script(
-                "cat {path} || echo '{path} not exists yet'".format(
-                    path=self.unregistered_output_file))
-            LOG.debug("Unregistered VM result: %s", unregistered_result)
-            return expected_result in unregistered_result
-
-        expected_result = '1 packet captured'
-        unregistered_error_message = (
-            'Unregistered server did not received expected packet.')
-        if not self._is_multicast_traffic_expected(mcast_address):
-            # Kill the tcpdump command runs on the unregistered node with "-c"
-            # option so it will be stopped automatically if it will receive
-            # packet matching filters,
-            # We don't expect any packets to be captured really in this case
-            # so let's kill tcpdump so it flushes its output to the output
-            # file.
-            expected_result = ('0 packets captured')
-            unregistered_error_message = (
-                'Unregistered server received unexpected packet(s).')
-            try:
-                unregistered['ssh_client'].execute_script(
-                    "killall tcpdump && sleep 2", become_root=True)
-            except exceptions.SSHScriptFailed:
-                # Probably some packet was captured by tcpdump and due to that
-                # it is already stopped
-                self.assertTrue(check_unregistered_host(),
-                                unregistered_error_message)
-                return
-
-        utils.wait_until_true(
-            check_unregistered_host,
-            exception=RuntimeError(unregistered_error_message))
-
 
 class MulticastTestIPv4(BaseMulticastTest, base.BaseTempestTestCase):
 
@@ -36,7 +36,7 @@ class PortSecurityTest(base.BaseTempestTestCase):
         self.check_connectivity(self.fip['floating_ip_address'],
                                 CONF.validation.image_ssh_user,
                                 self.keypair['private_key'])
-        sec_group_id = self.security_groups[0]['id']
+        sec_group_id = self.security_group['id']
 
         self.port = self.update_port(port=self.port,
                                      port_security_enabled=False,
@@ -130,8 +130,7 @@ class QoSTestMixin(object):
                      'port_range_min': self.NC_PORT,
                      'port_range_max': self.NC_PORT,
                      'remote_ip_prefix': '0.0.0.0/0'}]
-        self.create_secgroup_rules(rulesets,
-                                   self.security_groups[-1]['id'])
+        self.create_secgroup_rules(rulesets, self.security_group['id'])
 
     def _create_qos_policy(self):
         policy = self.os_admin.network_client.create_qos_policy(
@@ -470,11 +470,9 @@ class NetworkSecGroupTest(base.BaseTempestTestCase):
         # add security group to cleanup
         self.security_groups.append(secgrp['security_group'])
         # create two ports with fixed IPs and the security group created
-        ports = []
-        for i in range(2):
-            ports.append(self.create_port(
-                self.network, fixed_ips=[{'subnet_id': self.subnets[0]['id']}],
-                security_groups=[secgrp['security_group']['id']]))
+        ports = self.create_ports(self.network, [
+            {'fixed_ips': [{'subnet_id': self.subnets[0]['id']}],
+             'security_groups': [secgrp['security_group']['id']]}] * 2)
         # spawn instances with the ports created
         server_ssh_clients, fips, servers = self.create_vm_testing_sec_grp(
             ports=ports)
@@ -24,7 +24,6 @@ import testtools
 
 from neutron_tempest_plugin.common import ip
 from neutron_tempest_plugin.common import ssh
-from neutron_tempest_plugin.common import utils
 from neutron_tempest_plugin import config
 from neutron_tempest_plugin.scenario import base
 
@@ -142,37 +141,19 @@ class TrunkTest(base.BaseTempestTestCase):
                                   networks=[{'port': port['id']}],
                                   **params)['server']
 
-    def _show_port(self, port, update=False):
-        observed = self.client.show_port(port['id'])['port']
-        if update:
-            port.update(observed)
-        return observed
-
-    def _show_trunk(self, trunk, update=False):
-        observed = self.client.show_trunk(trunk['id'])['trunk']
-        if update:
-            trunk.update(observed)
-        return observed
-
-    def _is_trunk_status(self, trunk, status, update=False):
-        return self._show_trunk(trunk, update)['status'] == status
-
-    def _is_port_status(self, port, status, update=False):
-        return self._show_port(port, update)['status'] == status
+    def _wait_for_ports(self, ports, status=constants.ACTIVE):
+        self.client.wait_for_resources_status(
+            'port', [port['id'] for port in ports], status, timeout=60)
 
     def _wait_for_port(self, port, status=constants.ACTIVE):
-        utils.wait_until_true(
-            lambda: self._is_port_status(port, status),
-            exception=RuntimeError(
-                "Timed out waiting for port {!r} to transition to get "
-                "status {!r}.".format(port['id'], status)))
+        self._wait_for_ports([port], status=status)
+
+    def _wait_for_trunks(self, trunks, status=constants.ACTIVE):
+        self.client.wait_for_resources_status(
+            'trunk', [trunk['id'] for trunk in trunks], status, timeout=60)
 
     def _wait_for_trunk(self, trunk, status=constants.ACTIVE):
-        utils.wait_until_true(
-            lambda: self._is_trunk_status(trunk, status),
-            exception=RuntimeError(
-                "Timed out waiting for trunk {!r} to transition to get "
-                "status {!r}.".format(trunk['id'], status)))
+        self._wait_for_trunks([trunk], status=status)
 
     def _create_ssh_client(self, floating_ip, use_advanced_image=False):
         if use_advanced_image:
@@ -190,8 +171,7 @@ class TrunkTest(base.BaseTempestTestCase):
         self.wait_for_server_active(server=vm.server)
         self.wait_for_guest_os_ready(vm.server)
         self._wait_for_trunk(trunk=vm.trunk)
-        self._wait_for_port(port=vm.port)
-        self._wait_for_port(port=vm.subport)
+        self._wait_for_ports([vm.port, vm.subport])
         self.check_connectivity(
             host=vm.floating_ip['floating_ip_address'],
             ssh_client=vm.ssh_client,
@@ -250,8 +230,7 @@ class TrunkTest(base.BaseTempestTestCase):
         # add all subports to server1
         self.client.add_subports(vm1.trunk['id'], subports)
         self._wait_for_trunk(vm1.trunk)
-        for port in tagged_ports:
-            self._wait_for_port(port)
+        self._wait_for_ports(tagged_ports)
 
         # ensure main data-plane wasn't interrupted
         self._assert_has_ssh_connectivity(vm1.ssh_client)
@@ -259,18 +238,15 @@ class TrunkTest(base.BaseTempestTestCase):
         # move subports over to other server
         self.client.remove_subports(vm1.trunk['id'], subports)
         # ensure all subports go down
-        for port in tagged_ports:
-            self._wait_for_port(port, status=constants.DOWN)
+        self._wait_for_ports(tagged_ports, status=constants.DOWN)
 
         self.client.add_subports(vm2.trunk['id'], subports)
 
         # wait for both trunks to go back to ACTIVE
-        for vm in [vm1, vm2]:
-            self._wait_for_trunk(vm.trunk)
+        self._wait_for_trunks([vm1.trunk, vm2.trunk])
 
         # ensure subports come up on other trunk
-        for port in tagged_ports:
-            self._wait_for_port(port)
+        self._wait_for_ports(tagged_ports)
 
         # final connectivity check
         for vm in [vm1, vm2]:
@@ -33,6 +33,7 @@ class Manager(manager.Manager):
             build_interval=CONF.network.build_interval,
             build_timeout=CONF.network.build_timeout,
             **self.default_params)
+        self.share_http_connections()
 
 
 class BgpSpeakerClientJSON(rest_client.RestClient):
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from concurrent import futures
+import copy
+import threading
 import time
 from urllib import parse as urlparse
 
@@ -17,6 +20,18 @@ from oslo_serialization import jsonutils
 from tempest.lib.common import rest_client as service_client
 from tempest.lib import exceptions as lib_exc
 
+from neutron_tempest_plugin.common import json_list
+from neutron_tempest_plugin import config
+
+CONF = config.CONF
+
+
+def _get_revision_number(body):
+    # Shown resources bodies are in form {'resource': {...}}
+    for resource in body.values():
+        if isinstance(resource, dict):
+            return resource.get('revision_number')
+
 
 class NetworkClientJSON(service_client.RestClient):
     """NetworkClientJSON class
@@ -36,29 +51,76 @@ class NetworkClientJSON(service_client.RestClient):
     version = '2.0'
     uri_prefix = "v2.0"
 
+    # Seconds shown resources are cached for. Zero disables the cache
+    show_cache_ttl = CONF.neutron_plugin_options.show_cache_ttl
+    # Whether concurrent identical GET requests share the same response
+    coalesce_get_requests = CONF.neutron_plugin_options.coalesce_get_requests
+
+    # Plural names of resources Neutron can't create with bulk requests
+    bulk_unsupported = set()
+    # Max number of concurrent requests creating resources one by one when
+    # bulk requests are not supported
+    bulk_create_workers = 10
+    # Initial interval in seconds between polling rounds of resource waiters
+    wait_min_interval = 0.2
+    # Max number of resource IDs used to filter every list request sent by
+    # resource waiters
+    wait_ids_per_request = 100
+    # Whether resource waiters list only resources changed since their
+    # previous polling round
+    wait_changed_since = CONF.neutron_plugin_options.wait_changed_since
+
+    # The following list represents resource names that do not require
+    # changing underscore to a hyphen
+    hyphen_exceptions = frozenset(["service_profiles", "availability_zones"])
+    # The following map is used to construct proper URI
+    # for the given neutron resource.
+    # No need to populate this map if the neutron resource
+    # doesn't have a URI prefix.
+    service_resource_prefix_map = {
+        'metering_labels': 'metering',
+        'metering_label_rules': 'metering',
+        'policies': 'qos',
+        'bandwidth_limit_rules': 'qos',
+        'minimum_bandwidth_rules': 'qos',
+        'rule_types': 'qos',
+        'logs': 'log',
+        'loggable_resources': 'log',
+    }
+    # map from resource name to a plural name
+    # needed only for those which can't be constructed as name + 's'
+    resource_plural_map = {
+        'security_groups': 'security_groups',
+        'security_group_rules': 'security_group_rules',
+        'quotas': 'quotas',
+        'qos_policy': 'policies',
+        'rbac_policy': 'rbac_policies',
+        'network_ip_availability': 'network_ip_availabilities',
+    }
+    # Prefixes of the methods built by __getattr__ and the names of the
+    # methods building them from the rest of the method name
+    method_builders = (
+        ("list_", "_lister"),
+        ("delete_", "_deleter"),
+        ("show_", "_shower"),
+        ("create_bulk_", "_bulk_creater"),
+        ("create_", "_creater"),
+        ("update_", "_updater"),
+        ("iter_", "_iterator"),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(NetworkClientJSON, self).__init__(*args, **kwargs)
+        self._show_cache = {}
+        self._generation = 0
+        self._gets_in_progress = {}
+        self._lock = threading.Lock()
+
     def get_uri(self, plural_name):
         # get service prefix from resource name
-
-        # The following list represents resource names that do not require
-        # changing underscore to a hyphen
-        hyphen_exceptions = ["service_profiles", "availability_zones"]
-        # The following map is used to construct proper URI
-        # for the given neutron resource.
-        # No need to populate this map if the neutron resource
-        # doesn't have a URI prefix.
-        service_resource_prefix_map = {
-            'metering_labels': 'metering',
-            'metering_label_rules': 'metering',
-            'policies': 'qos',
-            'bandwidth_limit_rules': 'qos',
-            'minimum_bandwidth_rules': 'qos',
-            'rule_types': 'qos',
-            'logs': 'log',
-            'loggable_resources': 'log',
-        }
-        service_prefix = service_resource_prefix_map.get(
+        service_prefix = self.service_resource_prefix_map.get(
             plural_name)
-        if plural_name not in hyphen_exceptions:
+        if plural_name not in self.hyphen_exceptions:
             plural_name = plural_name.replace("_", "-")
         if service_prefix:
             uri = '%s/%s/%s' % (self.uri_prefix, service_prefix,
@@ -75,29 +137,127 @@ class NetworkClientJSON(service_client.RestClient):
 
     def pluralize(self, resource_name):
         # get plural from map or just add 's'
+        return self.resource_plural_map.get(resource_name,
+                                            resource_name + 's')
 
-        # map from resource name to a plural name
-        # needed only for those which can't be constructed as name + 's'
-        resource_plural_map = {
-            'security_groups': 'security_groups',
-            'security_group_rules': 'security_group_rules',
-            'quotas': 'quotas',
-            'qos_policy': 'policies',
-            'rbac_policy': 'rbac_policies',
-            'network_ip_availability': 'network_ip_availabilities',
-        }
-        return resource_plural_map.get(resource_name, resource_name + 's')
+    def show_uri(self, uri):
+        """Shows a resource, from show cache if enabled and not expired
+
+        When show_cache_ttl is greater than zero, shown resources are cached
+        for show_cache_ttl seconds. A cached resource is only replaced by
+        a newer or equal revision of it. The whole cache is invalidated by
+        any request other than GET sent by this client.
+        """
+        use_cache = self.show_cache_ttl > 0
+        if use_cache:
+            with self._lock:
+                cached = self._show_cache.get(uri)
+                generation = self._generation
+            if cached and cached['expires_at'] > time.time():
+                return service_client.ResponseBody(
+                    cached['response'], copy.deepcopy(cached['body']))
+        resp, body = self.get(uri)
+        body = self.deserialize_single(body)
+        self.expected_success(200, resp.status)
+        if use_cache:
+            self._cache_shown(uri, resp, body, generation)
+        return service_client.ResponseBody(resp, body)
+
+    def _cache_shown(self, uri, resp, body, generation):
+        revision = _get_revision_number(body)
+        with self._lock:
+            if generation != self._generation:
+                # Resources could have been modified while being shown
+                return
+            cached = self._show_cache.get(uri)
+            if (cached and revision is not None and
+                    cached['revision'] is not None and
+                    cached['revision'] > revision):
+                return
+            self._show_cache[uri] = {
+                'expires_at': time.time() + self.show_cache_ttl,
+                'revision': revision,
+                'response': resp,
+                'body': copy.deepcopy(body)}
+
+    def clear_show_cache(self):
+        with self._lock:
+            self._generation += 1
+            self._show_cache.clear()
+
+    def request(self, method, url, extra_headers=False, headers=None,
+                body=None, chunked=False):
+        if (method == 'GET' and self.coalesce_get_requests and
+                not (extra_headers or headers or chunked)):
+            return self._coalesced_get(url)
+        if method in ('GET', 'HEAD'):
+            return super(NetworkClientJSON, self).request(
+                method, url, extra_headers, headers, body, chunked)
+        # Resources are invalidated before and after they are modified to
+        # discard the ones being shown meanwhile
+        self.clear_show_cache()
+        try:
+            return super(NetworkClientJSON, self).request(
+                method, url, extra_headers, headers, body, chunked)
+        finally:
+            self.clear_show_cache()
+
+    def _coalesced_get(self, url):
+        """Sends a GET request unless an identical one is in progress
+
+        Threads sending a GET request for the same URL while it is in progress
+        share its response (or its error) instead of sending it again. Only
+        requests sent since the last request modifying resources through
+        this client are shared.
+        """
+        with self._lock:
+            key = (url, self._generation)
+            in_progress = self._gets_in_progress.get(key)
+            if in_progress is None:
+                in_progress = self._gets_in_progress[key] = futures.Future()
+                sender = True
+            else:
+                sender = False
+        if not sender:
+            return in_progress.result()
+
+        error = None
+        try:
+            result = super(NetworkClientJSON, self).request('GET', url)
+        except Exception as ex:
+            error = ex
+        with self._lock:
+            del self._gets_in_progress[key]
+        if error is not None:
+            in_progress.set_exception(error)
+            raise error
+        in_progress.set_result(result)
+        return result
 
     def get_uri_with_links(self, plural_name, uri):
         resp, body = self.get(uri)
-        result = {plural_name: self.deserialize_list(body)}
-        links = self.deserialize_links(body)
+        resources, links = self.deserialize_list_with_links(body)
+        result = {plural_name: resources}
         self.expected_success(200, resp.status)
         return links, service_client.ResponseBody(resp, result)
 
+    def stream_uri(self, uri):
+        """Lists resources decoding them while the response is received
+
+        :returns: a json_list.ListDecoder instance yielding listed resources.
+        It should be closed if the iteration is not completed.
+        """
+        resp, _ = self.get(uri, chunked=True)
+        self.expected_success(200, resp.status)
+        return json_list.ListDecoder(resp.stream(), response=resp)
+
     def _lister(self, plural_name):
+        base_uri = self.get_uri(plural_name)
+
         def _list(**filters):
-            uri = self.build_uri(plural_name, **filters)
+            uri = base_uri
+            if filters:
+                uri += '?' + urlparse.urlencode(filters, doseq=1)
             resp, body = self.get(uri)
             result = {plural_name: self.deserialize_list(body)}
             self.expected_success(200, resp.status)
@@ -105,42 +265,96 @@ class NetworkClientJSON(service_client.RestClient):
 
         return _list
 
+    def _iterator(self, plural_name):
+        def _iter(page_size=100, prefetch=True, **filters):
+            """Yields resources listed page by page
+
+            Pages are requested using 'limit' and 'marker' filters until the
+            server reports there are no more pages to list. When prefetch is
+            True next page is requested in background while resources of the
+            current one are yielded, otherwise resources are yielded while
+            every page is received. Listed resources must have an 'id'.
+            """
+            fields = filters.get('fields')
+            if isinstance(fields, str):
+                fields = [fields]
+            if fields and 'id' not in fields:
+                # Resource IDs are required as page markers
+                filters['fields'] = list(fields) + ['id']
+
+            def get_page_uri(marker=None):
+                page_filters = dict(filters, limit=page_size)
+                if marker:
+                    page_filters['marker'] = marker
+                return self.build_uri(plural_name, **page_filters)
+
+            def get_page(marker=None):
+                links, body = self.get_uri_with_links(
+                    plural_name, get_page_uri(marker))
+                return body[plural_name], links
+
+            if not prefetch:
+                marker = None
+                while True:
+                    with self.stream_uri(get_page_uri(marker)) as page:
+                        resource = None
+                        for resource in page:
+                            yield resource
+                    if resource is None or 'next' not in page.links:
+                        return
+                    marker = resource['id']
+
+            executor = futures.ThreadPoolExecutor(max_workers=1)
+            try:
+                resources, links = get_page()
+                while True:
+                    next_page = None
+                    if resources and 'next' in links:
+                        next_page = executor.submit(get_page,
+                                                    resources[-1]['id'])
+                    for resource in resources:
+                        yield resource
+                    if next_page is None:
+                        break
+                    resources, links = next_page.result()
+            finally:
+                executor.shutdown(wait=False)
+
+        return _iter
+
     def _deleter(self, resource_name):
+        uri_template = self.get_uri(self.pluralize(resource_name)) + '/%s'
+
         def _delete(resource_id):
-            plural = self.pluralize(resource_name)
-            uri = '%s/%s' % (self.get_uri(plural), resource_id)
-            resp, body = self.delete(uri)
+            resp, body = self.delete(uri_template % resource_id)
             self.expected_success(204, resp.status)
             return service_client.ResponseBody(resp, body)
 
         return _delete
 
     def _shower(self, resource_name):
+        plural = self.pluralize(resource_name)
+        if 'details_quotas' in plural:
+            details, plural = plural.split('_')
+            uri_template = '%s/%%s/%s' % (self.get_uri(plural), details)
+        else:
+            uri_template = self.get_uri(plural) + '/%s'
+
         def _show(resource_id, **fields):
             # fields is a dict which key is 'fields' and value is a
             # list of field's name. An example:
             # {'fields': ['id', 'name']}
-            plural = self.pluralize(resource_name)
-            if 'details_quotas' in plural:
-                details, plural = plural.split('_')
-                uri = '%s/%s/%s' % (self.get_uri(plural),
-                                    resource_id, details)
-            else:
-                uri = '%s/%s' % (self.get_uri(plural), resource_id)
-
+            uri = uri_template % resource_id
             if fields:
                 uri += '?' + urlparse.urlencode(fields, doseq=1)
-            resp, body = self.get(uri)
-            body = self.deserialize_single(body)
-            self.expected_success(200, resp.status)
-            return service_client.ResponseBody(resp, body)
+            return self.show_uri(uri)
 
         return _show
 
     def _creater(self, resource_name):
+        uri = self.get_uri(self.pluralize(resource_name))
+
         def _create(**kwargs):
-            plural = self.pluralize(resource_name)
-            uri = self.get_uri(plural)
             post_data = self.serialize({resource_name: kwargs})
             resp, body = self.post(uri, post_data)
             body = self.deserialize_single(body)
@@ -149,11 +363,61 @@ class NetworkClientJSON(service_client.RestClient):
 
         return _create
 
+    def _bulk_creater(self, resource_name):
+        plural = self.pluralize(resource_name)
+        uri = self.get_uri(plural)
+
+        def _create_bulk(items):
+            """Creates resources with given list of attributes
+
+            Resources are created with a single bulk request. If bulk
+            operations are not supported for them, they are created
+            concurrently one by one instead. In that case if any creation
+            fails, resources already created are deleted before raising.
+            """
+            if plural not in self.bulk_unsupported:
+                post_data = self.serialize({plural: items})
+                try:
+                    resp, body = self.post(uri, post_data)
+                except lib_exc.BadRequest as ex:
+                    if 'Bulk operation not supported' not in str(ex):
+                        raise
+                    self.bulk_unsupported.add(plural)
+                else:
+                    body = self.deserialize_single(body)
+                    self.expected_success(201, resp.status)
+                    return service_client.ResponseBody(resp, body)
+            return self._create_concurrently(resource_name, items)
+
+        return _create_bulk
+
+    def _create_concurrently(self, resource_name, items):
+        plural = self.pluralize(resource_name)
+        create = self._creater(resource_name)
+        delete = self._deleter(resource_name)
+        workers = min(len(items), self.bulk_create_workers) or 1
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = [executor.submit(create, **item) for item in items]
+            futures.wait(results)
+            created = [result.result()[resource_name] for result in results
+                       if not result.exception()]
+            errors = [result.exception() for result in results
+                      if result.exception()]
+            if errors:
+                # Best effort to leave no resource behind like a failed bulk
+                # request would do
+                for resource in created:
+                    executor.submit(delete, resource['id'])
+                raise errors[0]
+        resp = results[0].result().response if results else {}
+        return service_client.ResponseBody(resp, {plural: created})
+
     def _updater(self, resource_name):
+        uri_template = self.get_uri(self.pluralize(resource_name)) + '/%s'
+
         def _update(res_id, **kwargs):
             headers = kwargs.pop('headers', {})
-            plural = self.pluralize(resource_name)
-            uri = '%s/%s' % (self.get_uri(plural), res_id)
+            uri = uri_template % res_id
             post_data = self.serialize({resource_name: kwargs})
             resp, body = self.put(uri, post_data, headers=headers)
             body = self.deserialize_single(body)
@@ -163,16 +427,13 @@ class NetworkClientJSON(service_client.RestClient):
         return _update
 
     def __getattr__(self, name):
-        method_prefixes = ["list_", "delete_", "show_", "create_", "update_"]
-        method_functors = [self._lister,
-                           self._deleter,
-                           self._shower,
-                           self._creater,
-                           self._updater]
-        for index, prefix in enumerate(method_prefixes):
-            prefix_len = len(prefix)
-            if name[:prefix_len] == prefix:
-                return method_functors[index](name[prefix_len:])
+        for prefix, builder in self.method_builders:
+            if name.startswith(prefix):
+                functor = getattr(self, builder)(name[len(prefix):])
+                # Built methods are stored as instance attributes so that
+                # __getattr__ is not called again for them
+                setattr(self, name, functor)
+                return functor
         raise AttributeError(name)
 
     # Subnetpool methods
@@ -287,13 +548,115 @@ class NetworkClientJSON(service_client.RestClient):
 
     def wait_for_resource_deletion(self, resource_type, id):
         """Waits for a resource to be deleted."""
-        start_time = int(time.time())
+        self.wait_for_resources_deletion(resource_type, [id])
+
+    def wait_for_resources_deletion(self, resource_type, ids, timeout=None,
+                                    max_interval=None):
+        """Waits for resources of the same type to be deleted.
+
+        See wait_for_resources method for the parameters.
+        """
+        # Deleted resources are never listed as changed
+        self.wait_for_resources(
+            resource_type, ids, lambda resource: resource is None,
+            'deleted', fields=['id'], timeout=timeout,
+            max_interval=max_interval, changed_since=False)
+
+    def wait_for_resources_status(self, resource_type, ids, status,
+                                  timeout=None, max_interval=None,
+                                  changed_since=None):
+        """Waits for resources of the same type to get given status.
+
+        See wait_for_resources method for the parameters.
+
+        :returns: a dictionary mapping resource IDs to their 'id' and
+        'status' attributes as last observed.
+        """
+        return self.wait_for_resources(
+            resource_type, ids,
+            lambda resource: resource and resource['status'] == status,
+            status, fields=['id', 'status'], timeout=timeout,
+            max_interval=max_interval, changed_since=changed_since)
+
+    def wait_for_resources(self, resource_type, ids, is_ready, description,
+                           fields=None, timeout=None, max_interval=None,
+                           changed_since=None):
+        """Waits until the condition holds for every given resource.
+
+        Every polling round sends a single list request filtered by the IDs
+        of the resources still to wait for (split in more requests only when
+        there are more than wait_ids_per_request of them). Polling interval
+        starts from wait_min_interval and is doubled after every round not
+        seeing any resource getting ready, up to max_interval.
+
+        When changed_since is enabled, after the first round only resources
+        updated since the latest 'updated_at' timestamp already observed are
+        listed, while the others are assumed to be unchanged. It requires the
+        'standard-attr-timestamp' extension and it can't be used to wait for
+        resources to be deleted.
+
+        :param resource_type: resource name as in show_<resource_type> method
+        :param ids: IDs of the resources to wait for
+        :param is_ready: callable receiving the listed resource (or None if it
+        is not listed) and returning True if it is ready
+        :param description: expected state used in the timeout error message
+        :param fields: resource fields to be listed. All fields by default
+        :param timeout: seconds to wait for. Defaults to build_timeout
+        :param max_interval: max seconds between polling rounds. Defaults to
+        build_interval
+        :param changed_since: whether to list only resources changed since
+        previous round. Defaults to wait_changed_since
+        :returns: a dictionary mapping resource IDs to resources as last
+        observed.
+        """
+        plural = self.pluralize(resource_type)
+        list_resources = self._lister(plural)
+        timeout = timeout or self.build_timeout
+        max_interval = max_interval or self.build_interval
+        min_interval = min(self.wait_min_interval, max_interval)
+        if changed_since is None:
+            changed_since = self.wait_changed_since
+        if changed_since and fields and 'updated_at' not in fields:
+            fields = list(fields) + ['updated_at']
+        filters = {'fields': fields} if fields else {}
+        interval = min_interval
+        end_time = time.time() + timeout
+        pending = sorted(set(ids))
+        observed = {}
         while True:
-            if self.is_resource_deleted(resource_type, id):
-                return
-            if int(time.time()) - start_time >= self.build_timeout:
-                raise lib_exc.TimeoutException
-            time.sleep(self.build_interval)
+            listed = {}
+            for index in range(0, len(pending), self.wait_ids_per_request):
+                chunk = pending[index:index + self.wait_ids_per_request]
+                for resource in list_resources(id=chunk,
+                                               **filters)[plural]:
+                    listed[resource['id']] = resource
+            observed.update(listed)
+            if changed_since:
+                # Resources not listed are unchanged since previous rounds
+                listed = observed
+                if observed:
+                    filters['changed_since'] = max(
+                        resource['updated_at']
+                        for resource in observed.values())
+            still_pending = [resource_id for resource_id in pending
+                             if not is_ready(listed.get(resource_id))]
+            if not still_pending:
+                return observed
+            if time.time() >= end_time:
+                raise lib_exc.TimeoutException(
+                    "Timed out after %(timeout)s seconds waiting for "
+                    "%(plural)s to be %(description)s, still waiting for "
+                    "%(pending)s" % {
+                        'timeout': timeout, 'plural': plural,
+                        'description': description,
+                        'pending': [listed.get(resource_id, resource_id)
+                                    for resource_id in still_pending]})
+            if len(still_pending) < len(pending):
+                interval = min_interval
+            else:
+                interval = min(interval * 2, max_interval)
+            pending = still_pending
+            time.sleep(max(0, min(interval, end_time - time.time())))
 
     def is_resource_deleted(self, resource_type, id):
         method = 'show_' + resource_type
@@ -306,30 +669,17 @@ class NetworkClientJSON(service_client.RestClient):
         return False
 
     def deserialize_single(self, body):
-        return jsonutils.loads(body)
+        return json_list.loads(body)
 
     def deserialize_list(self, body):
-        res = jsonutils.loads(body)
-        # expecting response in form
-        # {'resources': [ res1, res2] } => when pagination disabled
-        # {'resources': [..], 'resources_links': {}} => if pagination enabled
-        for k in res.keys():
-            if k.endswith("_links"):
-                continue
-            return res[k]
+        return self.deserialize_list_with_links(body)[0]
 
     def deserialize_links(self, body):
-        res = jsonutils.loads(body)
-        # expecting response in form
-        # {'resources': [ res1, res2] } => when pagination disabled
-        # {'resources': [..], 'resources_links': {}} => if pagination enabled
-        for k in res.keys():
-            if k.endswith("_links"):
-                return {
-                    link['rel']: link['href']
-                    for link in res[k]
-                }
-        return {}
+        return self.deserialize_list_with_links(body)[1]
+
+    def deserialize_list_with_links(self, body):
+        # Body is parsed only once for both resources and links
+        return json_list.split_list(json_list.loads(body))
 
     def serialize(self, data):
         return jsonutils.dumps(data)
@@ -719,10 +1069,7 @@ class NetworkClientJSON(service_client.RestClient):
 
     def show_trunk(self, trunk_id):
         uri = '%s/trunks/%s' % (self.uri_prefix, trunk_id)
-        resp, body = self.get(uri)
-        body = self.deserialize_single(body)
-        self.expected_success(200, resp.status)
-        return service_client.ResponseBody(resp, body)
+        return self.show_uri(uri)
 
     def list_trunks(self, **kwargs):
         uri = '%s/trunks' % self.uri_prefix
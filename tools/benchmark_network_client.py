@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures client side overhead of NetworkClientJSON dynamic methods
+
+Requests are not sent to any server: every request gets the same canned
+response, so that only the time spent by the client building requests and
+decoding responses is measured.
+
+Usage: python tools/benchmark_network_client.py [--number N]
+"""
+
+import argparse
+import timeit
+
+from neutron_tempest_plugin.services.network.json import network_client
+
+
+class _Response(dict):
+    status = 200
+
+
+class _BenchmarkClient(network_client.NetworkClientJSON):
+
+    def request(self, method, url, *args, **kwargs):
+        if url.endswith('/networks'):
+            return _Response(), b'{"networks": []}'
+        return _Response(), b'{"network": {"id": "1"}}'
+
+
+BENCHMARKS = [
+    ('getattr list_networks', 'client.list_networks'),
+    ('get_uri', 'client.get_uri("metering_label_rules")'),
+    ('pluralize', 'client.pluralize("qos_policy")'),
+    ('list_networks()', 'client.list_networks()'),
+    ('show_network()', 'client.show_network("1")'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000,
+                        help='Number of executions of every benchmark')
+    args = parser.parse_args()
+
+    client = _BenchmarkClient(None, 'network', 'RegionOne')
+    for name, statement in BENCHMARKS:
+        seconds = min(timeit.repeat(statement, number=args.number, repeat=3,
+                                    globals={'client': client}))
+        print('%-24s %8.3f us/call' % (name, seconds / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()